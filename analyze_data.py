@@ -3,31 +3,58 @@ analyze_data.py - PLUS Product Data Analyzer
 Generates beautiful static visualizations and analysis reports from scraped data
 """
 
+import os
+import re
 import json
+import pickle
+import hashlib
+import importlib.util
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # Headless backend, selected before pyplot is imported
 import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 import numpy as np
-from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import logging
 import argparse
 
-# Optional imports with graceful fallback
+# Optional dependencies are probed here and imported only when used
+WORDCLOUD_AVAILABLE = importlib.util.find_spec('wordcloud') is not None
+if not WORDCLOUD_AVAILABLE:
+    print("⚠️  WordCloud not available. Install with: pip install wordcloud")
+
+# Faster JSON decoding for product files when ujson (a scraper dependency) is installed
 try:
-    from wordcloud import WordCloud
-    WORDCLOUD_AVAILABLE = True
+    from ujson import loads as json_loads
 except ImportError:
-    WORDCLOUD_AVAILABLE = False
-    print("⚠️  WordCloud not available. Install with: pip install wordcloud")
+    json_loads = json.loads
+
+# Use Arrow-backed strings for text columns when pyarrow is installed
+STRING_DTYPE = 'string[pyarrow]' if importlib.util.find_spec('pyarrow') else 'string'
+TEXT_COLUMNS = ('name', 'ingredients')
+
+# Low-cardinality labels stored as categoricals (integer codes for counting/grouping)
+CATEGORY_COLUMNS = ('brand', 'category')
+
+# Bump when the cached DataFrame layout changes so stale caches are rebuilt
+CACHE_VERSION = 3
+
+# Numeric columns stored as contiguous float32 buffers after loading
+PRODUCT_NUMERIC_COLUMNS = ('price', 'alcohol_percentage', 'weight')
+NUTRIENT_NUMERIC_COLUMNS = ('value', 'per_100g')
 
 # Configure matplotlib for high-quality output
-import matplotlib
-matplotlib.use('Agg')
 plt.rcParams['figure.dpi'] = 300
 plt.rcParams['savefig.dpi'] = 300
 plt.rcParams['savefig.bbox'] = 'tight'
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
+plt.rcParams['agg.path.chunksize'] = 10000
+
+# Fast zlib level for PNG output; the files stay lossless
+PNG_PIL_KWARGS = {'compress_level': 1}
 
 # Configure logging
 logging.basicConfig(
@@ -37,14 +64,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Nutrient names that denote protein content
+PROTEIN_PATTERN = re.compile(r'eiwit|protein', re.IGNORECASE)
+
+# Punctuation that separates words in ingredient lists
+INGREDIENT_SEPARATORS = str.maketrans({c: ' ' for c in ',()[].:;%*'})
+
+# Custom stopwords for Dutch ingredient lists (lowercase, matched against lowercased tokens)
+DUTCH_STOPWORDS = frozenset({
+    'en', 'van', 'de', 'het', 'een', 'in', 'met', 'voor', 'uit', 'op', 'aan', 'bij',
+    'water', 'zout', 'suiker', 'kan', 'bevatten', 'sporen', 'e', 'mg', 'g', 'kg',
+    'bevat', 'ingrediënten', 'ingredienten', 'procent', '%'
+})
+
+# Report key -> chart method; each chart only reads the loaded DataFrames
+CHART_METHODS = {
+    'price_distribution': 'create_price_distribution_chart',
+    'brand_analysis': 'create_brand_analysis_chart',
+    'protein_analysis': 'create_protein_analysis',
+    'ingredients_wordcloud': 'create_ingredients_wordcloud',
+    'alcohol_analysis': 'create_alcohol_analysis',
+}
+
+# Analyzer copy held by each chart worker process
+_WORKER_ANALYZER = None
+
+
+def _apply_chart_style(colors: List[str]) -> None:
+    """Set the chart style and color cycle for the current process"""
+    # matplotlib's bundled whitegrid style, no seaborn import
+    plt.style.use('seaborn-v0_8-whitegrid')
+    plt.rcParams['axes.prop_cycle'] = plt.cycler(color=colors)
+
+
+def _init_chart_worker(analyzer: 'PLUSDataAnalyzer') -> None:
+    """Store the analyzer and apply its chart style once per worker process"""
+    global _WORKER_ANALYZER
+    _WORKER_ANALYZER = analyzer
+    # Unpickling skips __init__, so spawned workers would otherwise render with the defaults
+    _apply_chart_style(analyzer.colors)
+
+
+def _render_chart(method_name: str) -> str:
+    """Run a single chart method in a worker process"""
+    return getattr(_WORKER_ANALYZER, method_name)()
+
+
+def _json_default(value: Any) -> Any:
+    """Convert numpy scalars/arrays for the JSON encoder"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _top_k(df: pd.DataFrame, column: str, k: int, largest: bool = True) -> pd.DataFrame:
+    """Return the k rows with the largest (or smallest) values in column, best first (NaNs skipped)"""
+    values = df[column].to_numpy(dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(values))
+    k = min(k, len(valid))
+    if k == 0:
+        return df.iloc[:0]
+    
+    # Partial selection finds the k-th best value; rows strictly better than it are all kept and
+    # ties at that value are taken in row order, like nlargest/nsmallest(keep='first')
+    keys = -values if largest else values
+    valid_keys = keys[valid]
+    kth = np.partition(valid_keys, k - 1)[k - 1]
+    better = valid[valid_keys < kth]
+    ties = valid[valid_keys == kth][:k - len(better)]
+    candidates = np.sort(np.concatenate((better, ties)))
+    order = np.argsort(keys[candidates], kind='stable')
+    return df.iloc[candidates[order]]
+
+def _shorten_labels(names: pd.Series, width: int) -> List[str]:
+    """Truncate names longer than width to width characters plus '...'"""
+    names = names.astype(str)
+    return names.where(names.str.len() <= width, names.str.slice(0, width) + '...').tolist()
+
 class PLUSDataAnalyzer:
     """
     Analyzes scraped PLUS product data and generates beautiful visualizations
     """
     
-    def __init__(self, data_dir: str = "scraper/data"):
+    def __init__(self, data_dir: str = "scraper/data", use_cache: bool = True, workers: int = 1,
+                 render_charts: bool = True):
         self.data_dir = Path(data_dir)
         self.products_dir = self.data_dir / "products"
+        self.cache_file = self.data_dir / "analysis_cache.pkl"
+        self.use_cache = use_cache
+        self.workers = workers
+        self.render_charts = render_charts
         self.output_dir = Path("data/analysis")
         self.images_dir = self.output_dir / "images"
         
@@ -55,14 +165,14 @@ class PLUSDataAnalyzer:
         # Data containers
         self.products_df = None
         self.nutrients_df = None
+        self.products_by_sku = None
+        self.files_processed = 0
         
         # Modern color palette
         self.colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', '#54A0FF']
-        sns.set_palette(self.colors)
         
         # Set modern style
-        plt.style.use('default')
-        sns.set_style("whitegrid")
+        _apply_chart_style(self.colors)
         
         logger.info(f"🔍 Analyzer initialized - Output: {self.output_dir}")
     
@@ -75,99 +185,180 @@ class PLUSDataAnalyzer:
             logger.error(f"❌ Products directory not found: {self.products_dir}")
             return False
         
-        product_files = list(self.products_dir.glob("*.json"))
+        # One directory pass; DirEntry caches its stat() for the cache signature below
+        with os.scandir(self.products_dir) as entries:
+            product_entries = [entry for entry in entries
+                               if entry.name.endswith(".json") and not entry.name.startswith(".") and entry.is_file()]
+        product_files = [Path(entry.path) for entry in product_entries]
         if not product_files:
             logger.error(f"❌ No product JSON files found in {self.products_dir}")
             return False
         
+        self.files_processed = len(product_files)
+        
+        # Reuse the parsed DataFrames when no product file changed since the last run
+        signature = self._source_signature(product_entries)
+        if self.use_cache and self._load_cache(signature):
+            self.products_by_sku = self.products_df.set_index('sku')
+            logger.info(f"✅ Loaded {len(self.products_df)} products with {len(self.nutrients_df)} nutrient entries from cache")
+            return True
+        
         logger.info(f"📊 Processing {len(product_files)} product files...")
         
         products_data = []
         nutrients_data = []
         
-        for file_path in product_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    product = json.load(f)
-                    
-                    # Extract basic product info
-                    product_info = {
-                        'sku': product.get('sku', ''),
-                        'name': product.get('name', ''),
-                        'brand': product.get('brand', ''),
-                        'price': self._parse_price(product.get('price', '0')),
-                        'category': product.get('category', ''),
-                        'ingredients': product.get('ingredients', ''),
-                        'allergens': product.get('allergens', ''),
-                        'alcohol_percentage': self._parse_float(product.get('alcohol_percentage', '0')),
-                        'weight': self._parse_float(product.get('weight', '0'))
-                    }
-                    products_data.append(product_info)
-                    
-                    # Extract nutrients
-                    nutrients = product.get('nutrients', [])
-                    for nutrient in nutrients:
-                        nutrient_info = {
-                            'sku': product.get('sku', ''),
-                            'product_name': product.get('name', ''),
-                            'name': nutrient.get('name', ''),
-                            'value': self._parse_float(nutrient.get('value', '0')),
-                            'unit': nutrient.get('unit', ''),
-                            'per_100g': self._parse_float(nutrient.get('per_100g', '0'))
-                        }
-                        nutrients_data.append(nutrient_info)
-                        
-            except Exception as e:
-                logger.warning(f"⚠️  Error processing {file_path.name}: {e}")
-                continue
+        # Read, parse and extract the files concurrently; each worker keeps only the
+        # extracted rows so the full product dicts are released right after parsing
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(self._extract_product_rows, product_files)
+            
+            for file_path, product_info, nutrients, error in results:
+                if error is not None:
+                    logger.warning(f"⚠️  Error processing {file_path.name}: {error}")
+                    continue
+                
+                products_data.append(product_info)
+                nutrients_data.extend(nutrients)
         
         # Create DataFrames
         self.products_df = pd.DataFrame(products_data)
         self.nutrients_df = pd.DataFrame(nutrients_data)
         
-        # Clean data
-        self.products_df = self.products_df[self.products_df['name'] != '']
-        self.products_df = self.products_df[self.products_df['price'] > 0]
+        # Parse price/percentage/weight strings in one vectorized pass per column
+        for col in PRODUCT_NUMERIC_COLUMNS:
+            self.products_df[col] = self._parse_numeric_column(self.products_df[col])
+        
+        # Clean data with one combined mask (single copy, no chained-indexing views)
+        valid = (self.products_df['name'] != '') & (self.products_df['price'] > 0)
+        self.products_df = self.products_df[valid].copy()
+        
+        # Convert text columns once so value_counts/str ops run on string buffers
+        for col in TEXT_COLUMNS:
+            self.products_df[col] = self.products_df[col].astype(STRING_DTYPE)
+        for col in CATEGORY_COLUMNS:
+            self.products_df[col] = self.products_df[col].astype('category')
+        
+        # Consolidate numeric columns into contiguous float32 blocks
+        for col in PRODUCT_NUMERIC_COLUMNS:
+            self.products_df[col] = self.products_df[col].astype(np.float32)
+        for col in NUTRIENT_NUMERIC_COLUMNS:
+            if col in self.nutrients_df:
+                self.nutrients_df[col] = self._parse_numeric_column(self.nutrients_df[col]).astype(np.float32)
+        
+        # Index products by SKU once so nutrient lookups can join without re-hashing
+        self.products_by_sku = self.products_df.set_index('sku')
+        if not self.nutrients_df.empty:
+            self.nutrients_df['name'] = self.nutrients_df['name'].astype('category')
+        
+        if self.use_cache:
+            self._save_cache(signature)
         
         logger.info(f"✅ Loaded {len(self.products_df)} products with {len(self.nutrients_df)} nutrient entries")
         return True
     
-    def _parse_price(self, price_str: str) -> float:
-        """Parse price string to float"""
-        if not price_str:
-            return 0.0
+    @staticmethod
+    def _extract_product_rows(file_path: Path) -> tuple:
+        """Parse one product file into (path, product_info, nutrients, error)"""
         try:
-            # Remove currency symbols and convert
-            clean_price = str(price_str).replace('€', '').replace(',', '.').strip()
-            return float(clean_price)
-        except:
-            return 0.0
+            product = json_loads(file_path.read_bytes())
+            
+            # Extract basic product info
+            product_info = {
+                'sku': product.get('sku', ''),
+                'name': product.get('name', ''),
+                'brand': product.get('brand', ''),
+                'price': product.get('price', '0'),
+                'category': product.get('category', ''),
+                'ingredients': product.get('ingredients', ''),
+                'allergens': product.get('allergens', ''),
+                'alcohol_percentage': product.get('percentage_alcohol') or product.get('alcohol_percentage') or '0',
+                'weight': product.get('weight', '0')
+            }
+            
+            # Extract nutrients (values are parsed per column after loading)
+            sku = product_info['sku']
+            product_name = product_info['name']
+            nutrients = [
+                {
+                    'sku': sku,
+                    'product_name': product_name,
+                    'name': nutrient.get('name', ''),
+                    'value': nutrient.get('value', '0'),
+                    'unit': nutrient.get('unit', ''),
+                    'per_100g': nutrient.get('per_100g', '0')
+                }
+                for nutrient in product.get('nutrients', [])
+            ]
+            return file_path, product_info, nutrients, None
+        except Exception as e:
+            return file_path, None, None, e
+    
+    def _source_signature(self, product_entries: List[os.DirEntry]) -> tuple:
+        """Fingerprint the cache layout and every product file's (name, mtime, size)"""
+        digest = hashlib.sha256()
+        for entry in sorted(product_entries, key=lambda entry: entry.name):
+            st = entry.stat()
+            digest.update(f"{entry.name}\0{st.st_mtime_ns}\0{st.st_size}\n".encode('utf-8'))
+        return (CACHE_VERSION, len(product_entries), digest.hexdigest())
+    
+    def _load_cache(self, signature: tuple) -> bool:
+        """Load cached DataFrames if they were built from the same product files"""
+        if not self.cache_file.exists():
+            return False
+        try:
+            with open(self.cache_file, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️  Ignoring unreadable analysis cache: {e}")
+            return False
+        
+        if cached.get('signature') != signature:
+            return False
+        
+        self.products_df = cached['products']
+        self.nutrients_df = cached['nutrients']
+        return True
     
-    def _parse_float(self, value: Any) -> float:
-        """Safely parse value to float"""
-        if not value:
-            return 0.0
+    def _save_cache(self, signature: tuple) -> None:
+        """Cache the parsed DataFrames next to the product files"""
         try:
-            return float(str(value).replace(',', '.'))
-        except:
-            return 0.0
+            with open(self.cache_file, 'wb') as f:
+                pickle.dump({
+                    'signature': signature,
+                    'products': self.products_df,
+                    'nutrients': self.nutrients_df
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not write analysis cache: {e}")
+    
+    def _parse_numeric_column(self, values: pd.Series) -> pd.Series:
+        """Parse a column of price/percentage/number strings to floats (unparseable -> 0.0)"""
+        # Drop currency/percent signs and whitespace, normalize decimal commas, then convert
+        cleaned = (
+            values.astype(str)
+            .str.replace(r'[€%\s]', '', regex=True)
+            .str.replace(',', '.', regex=False)
+        )
+        return pd.to_numeric(cleaned, errors='coerce').fillna(0.0)
     
     def generate_summary_stats(self) -> Dict[str, Any]:
         """Generate summary statistics"""
         if self.products_df is None or self.products_df.empty:
             return {}
         
-        # Filter out products with no price
-        priced_products = self.products_df[self.products_df['price'] > 0]
+        # load_data already dropped products without a price
+        prices = self.products_df['price'].to_numpy()
         
         stats = {
             'total_products': len(self.products_df),
-            'total_brands': len(self.products_df['brand'].dropna().unique()),
-            'avg_price': priced_products['price'].mean(),
-            'min_price': priced_products['price'].min(),
-            'max_price': priced_products['price'].max(),
-            'median_price': priced_products['price'].median(),
-            'total_categories': len(self.products_df['category'].dropna().unique()),
+            'total_brands': self.products_df['brand'].nunique(),
+            'avg_price': round(float(prices.mean(dtype=np.float64)), 2),
+            'min_price': round(float(prices.min()), 2),
+            'max_price': round(float(prices.max()), 2),
+            'median_price': round(float(np.median(prices)), 2),
+            'total_categories': self.products_df['category'].nunique(),
         }
         
         return stats
@@ -180,14 +371,13 @@ class PLUSDataAnalyzer:
         plt.figure(figsize=(12, 8))
         
         # Filter out extreme outliers for better visualization
-        priced_products = self.products_df[self.products_df['price'] > 0]
-        Q1 = priced_products['price'].quantile(0.25)
-        Q3 = priced_products['price'].quantile(0.75)
+        prices = self.products_df['price']
+        Q1, Q3 = np.quantile(prices.to_numpy(), [0.25, 0.75])
         IQR = Q3 - Q1
-        filtered_prices = priced_products[
-            (priced_products['price'] >= Q1 - 1.5 * IQR) & 
-            (priced_products['price'] <= Q3 + 1.5 * IQR)
-        ]['price']
+        filtered_prices = prices[
+            (prices >= Q1 - 1.5 * IQR) & 
+            (prices <= Q3 + 1.5 * IQR)
+        ]
         
         plt.hist(filtered_prices, bins=50, alpha=0.7, color='skyblue', edgecolor='black')
         plt.title('PLUS Product Price Distribution', fontsize=16, fontweight='bold')
@@ -202,7 +392,7 @@ class PLUSDataAnalyzer:
         
         output_path = self.images_dir / "price_distribution.png"
         plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.savefig(output_path, dpi=300, bbox_inches='tight', pil_kwargs=PNG_PIL_KWARGS)
         plt.close()
         
         logger.info(f"Price distribution chart saved to {output_path}")
@@ -216,12 +406,15 @@ class PLUSDataAnalyzer:
         # Get top 15 brands by product count
         brand_counts = self.products_df['brand'].value_counts().head(15)
         
+        brand_names = brand_counts.index.to_numpy()
+        counts = brand_counts.to_numpy()
+        
         plt.figure(figsize=(14, 8))
-        bars = plt.bar(range(len(brand_counts)), brand_counts.values, color='lightcoral')
+        bars = plt.bar(range(len(counts)), counts, color='lightcoral')
         plt.title('Top 15 Brands by Product Count', fontsize=16, fontweight='bold')
         plt.xlabel('Brand', fontsize=12)
         plt.ylabel('Number of Products', fontsize=12)
-        plt.xticks(range(len(brand_counts)), brand_counts.index, rotation=45, ha='right')
+        plt.xticks(range(len(counts)), brand_names, rotation=45, ha='right')
         
         # Add value labels on bars
         for bar in bars:
@@ -233,7 +426,7 @@ class PLUSDataAnalyzer:
         
         output_path = self.images_dir / "brand_analysis.png"
         plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.savefig(output_path, dpi=300, bbox_inches='tight', pil_kwargs=PNG_PIL_KWARGS)
         plt.close()
         
         logger.info(f"Brand analysis chart saved to {output_path}")
@@ -246,25 +439,22 @@ class PLUSDataAnalyzer:
         
         # Filter for protein data
         protein_data = self.nutrients_df[
-            self.nutrients_df['name'].str.contains('eiwit|protein', case=False, na=False)
+            self.nutrients_df['name'].str.contains(PROTEIN_PATTERN, na=False)
         ]
         
         if protein_data.empty:
             logger.warning("No protein data found")
             return ""
         
-        # Merge with product data
-        protein_products = protein_data.merge(
-            self.products_df[['sku', 'name', 'price']], 
-            on='sku', 
-            how='left'
+        # Join with product prices on the pre-built SKU index
+        protein_products = protein_data.join(
+            self.products_by_sku[['price']],
+            on='sku',
+            how='inner'
         )
         
-        # Filter for products with price and protein data
-        valid_data = protein_products[
-            (protein_products['per_100g'] > 0) & 
-            (protein_products['price'] > 0)
-        ].copy()
+        # Filter for products with protein data (prices are already positive)
+        valid_data = protein_products[protein_products['per_100g'] > 0].copy()
         
         if valid_data.empty:
             logger.warning("No valid protein/price data found")
@@ -277,28 +467,26 @@ class PLUSDataAnalyzer:
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
         
         # Top 10 highest protein products
-        top_protein = valid_data.nlargest(10, 'per_100g')
+        top_protein = _top_k(valid_data, 'per_100g', 10)
         ax1.barh(range(len(top_protein)), top_protein['per_100g'], color='lightgreen')
         ax1.set_yticks(range(len(top_protein)))
-        ax1.set_yticklabels([name[:30] + '...' if len(name) > 30 else name 
-                            for name in top_protein['name']], fontsize=8)
+        ax1.set_yticklabels(_shorten_labels(top_protein['product_name'], 30), fontsize=8)
         ax1.set_xlabel('Protein (g per 100g)')
         ax1.set_title('Top 10 Products by Protein Content')
         ax1.invert_yaxis()
         
         # Top 10 best protein value (protein per euro)
-        top_value = valid_data.nlargest(10, 'protein_per_euro')
+        top_value = _top_k(valid_data, 'protein_per_euro', 10)
         ax2.barh(range(len(top_value)), top_value['protein_per_euro'], color='lightblue')
         ax2.set_yticks(range(len(top_value)))
-        ax2.set_yticklabels([name[:30] + '...' if len(name) > 30 else name 
-                            for name in top_value['name']], fontsize=8)
+        ax2.set_yticklabels(_shorten_labels(top_value['product_name'], 30), fontsize=8)
         ax2.set_xlabel('Protein per Euro (g/€)')
         ax2.set_title('Top 10 Products by Protein Value')
         ax2.invert_yaxis()
         
         output_path = self.images_dir / "protein_analysis.png"
         plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.savefig(output_path, dpi=300, bbox_inches='tight', pil_kwargs=PNG_PIL_KWARGS)
         plt.close()
         
         logger.info(f"Protein analysis chart saved to {output_path}")
@@ -313,30 +501,37 @@ class PLUSDataAnalyzer:
         if self.products_df is None or self.products_df.empty:
             return ""
         
-        # Combine all ingredients
-        all_ingredients = ' '.join(self.products_df['ingredients'].dropna().astype(str))
+        # Tokenize, filter and count all ingredients with vectorized pandas ops
+        tokens = (
+            self.products_df['ingredients'].dropna().astype(str)
+            .str.lower()
+            .str.translate(INGREDIENT_SEPARATORS)
+            .str.split()
+            .explode()
+            .dropna()
+        )
+        tokens = tokens[
+            (tokens.str.len() > 2) &
+            ~tokens.str.isdigit() &
+            ~tokens.isin(DUTCH_STOPWORDS)
+        ]
+        frequencies = tokens.value_counts().to_dict()
         
-        if not all_ingredients.strip():
+        if not frequencies:
             logger.warning("No ingredients data found")
             return ""
         
-        # Custom stopwords for Dutch
-        dutch_stopwords = {
-            'en', 'van', 'de', 'het', 'een', 'in', 'met', 'voor', 'uit', 'op', 'aan', 'bij',
-            'water', 'zout', 'suiker', 'kan', 'bevatten', 'sporen', 'e', 'mg', 'g', 'kg',
-            'bevat', 'ingrediënten', 'ingredienten', 'procent', '%'
-        }
-        
         try:
+            from wordcloud import WordCloud
+            
             wordcloud = WordCloud(
                 width=1200, 
                 height=600,
                 background_color='white',
-                stopwords=dutch_stopwords,
                 max_words=100,
                 colormap='viridis',
                 collocations=False
-            ).generate(all_ingredients)
+            ).generate_from_frequencies(frequencies)
             
             plt.figure(figsize=(15, 8))
             plt.imshow(wordcloud, interpolation='bilinear')
@@ -345,7 +540,7 @@ class PLUSDataAnalyzer:
             
             output_path = self.images_dir / "ingredients_wordcloud.png"
             plt.tight_layout()
-            plt.savefig(output_path, dpi=300, bbox_inches='tight')
+            plt.savefig(output_path, dpi=300, bbox_inches='tight', pil_kwargs=PNG_PIL_KWARGS)
             plt.close()
             
             logger.info(f"Ingredients wordcloud saved to {output_path}")
@@ -361,17 +556,15 @@ class PLUSDataAnalyzer:
             return ""
         
         # Filter alcohol products
-        alcohol_products = self.products_df[
-            (self.products_df['alcohol_percentage'] > 0) & 
-            (self.products_df['price'] > 0)
-        ].copy()
+        # Alcohol percentages are parsed once in load_data; prices are already positive
+        alcohol_products = self.products_df[self.products_df['alcohol_percentage'] > 0]
         
         if alcohol_products.empty:
             logger.warning("No alcohol products found")
             return ""
         
         # Sort by price
-        cheapest_alcohol = alcohol_products.nsmallest(15, 'price')
+        cheapest_alcohol = _top_k(alcohol_products, 'price', 15, largest=False)
         
         plt.figure(figsize=(14, 8))
         bars = plt.bar(range(len(cheapest_alcohol)), cheapest_alcohol['price'], color='orange')
@@ -379,8 +572,7 @@ class PLUSDataAnalyzer:
         plt.xlabel('Product', fontsize=12)
         plt.ylabel('Price (€)', fontsize=12)
         plt.xticks(range(len(cheapest_alcohol)), 
-                  [name[:20] + '...' if len(name) > 20 else name 
-                   for name in cheapest_alcohol['name']], 
+                  _shorten_labels(cheapest_alcohol['name'], 20), 
                   rotation=45, ha='right')
         
         # Add value labels on bars
@@ -393,7 +585,7 @@ class PLUSDataAnalyzer:
         
         output_path = self.images_dir / "alcohol_analysis.png"
         plt.tight_layout()
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.savefig(output_path, dpi=300, bbox_inches='tight', pil_kwargs=PNG_PIL_KWARGS)
         plt.close()
         
         logger.info(f"Alcohol analysis chart saved to {output_path}")
@@ -409,27 +601,21 @@ class PLUSDataAnalyzer:
         # Generate summary stats
         stats = self.generate_summary_stats()
         
-        # Create all visualizations
-        charts = {
-            'price_distribution': self.create_price_distribution_chart(),
-            'brand_analysis': self.create_brand_analysis_chart(),
-            'protein_analysis': self.create_protein_analysis(),
-            'ingredients_wordcloud': self.create_ingredients_wordcloud(),
-            'alcohol_analysis': self.create_alcohol_analysis()
-        }
+        # Create all visualizations (skipped for stats-only runs)
+        charts = self._create_charts() if self.render_charts else {}
         
         # Create summary report
         report = {
             'summary_statistics': stats,
             'generated_charts': {k: v for k, v in charts.items() if v},
             'analysis_date': pd.Timestamp.now().isoformat(),
-            'total_files_processed': len(list(self.products_dir.glob("*.json")))
+            'total_files_processed': self.files_processed
         }
         
         # Save report as JSON
         report_path = self.output_dir / "analysis_report.json"
         with open(report_path, 'w', encoding='utf-8') as f:
-            json.dump(report, f, indent=2, ensure_ascii=False)
+            json.dump(report, f, ensure_ascii=False, separators=(',', ':'), default=_json_default)
         
         logger.info(f"Analysis report saved to {report_path}")
         
@@ -438,6 +624,17 @@ class PLUSDataAnalyzer:
         
         return str(report_path)
     
+    def _create_charts(self) -> Dict[str, str]:
+        """Render all charts, in parallel worker processes when enabled"""
+        if self.workers <= 1:
+            return {key: getattr(self, method)() for key, method in CHART_METHODS.items()}
+        
+        workers = min(self.workers, len(CHART_METHODS))
+        logger.info(f"🖼️  Rendering {len(CHART_METHODS)} charts with {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chart_worker, initargs=(self,)) as executor:
+            paths = executor.map(_render_chart, CHART_METHODS.values())
+            return dict(zip(CHART_METHODS.keys(), paths))
+    
     def _create_analysis_readme(self, stats: Dict[str, Any], charts: Dict[str, str]) -> None:
         """Create a README file for the analysis results"""
         readme_content = f"""# PLUS Product Data Analysis Results
@@ -473,7 +670,7 @@ class PLUSDataAnalyzer:
 
 - **Analysis Date**: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}
 - **Data Source**: Individual product JSON files from PLUS.nl scraper
-- **Visualization Tools**: Python (matplotlib, seaborn, wordcloud)
+- **Visualization Tools**: Python (matplotlib, wordcloud)
 
 ## Files Generated
 
@@ -490,24 +687,27 @@ class PLUSDataAnalyzer:
 
 def main():
     """Main function to run the analysis"""
-    import argparse
-    
     parser = argparse.ArgumentParser(description="PLUS Product Data Analyzer")
     parser.add_argument("--data-dir", default="data", help="Directory containing product JSON files")
     parser.add_argument("--output-dir", help="Output directory for analysis results")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse all product JSON files instead of using the analysis cache")
+    parser.add_argument("--no-charts", action="store_true", help="Only write the summary report, skip rendering charts")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to render charts (default 1 = serial; try more on large datasets)")
     
     args = parser.parse_args()
     
     # Initialize analyzer
     data_dir = args.data_dir
     if args.output_dir:
-        analyzer = PLUSDataAnalyzer(data_dir)
+        analyzer = PLUSDataAnalyzer(data_dir, use_cache=not args.no_cache, workers=args.workers,
+                                    render_charts=not args.no_charts)
         analyzer.output_dir = Path(args.output_dir)
         analyzer.images_dir = analyzer.output_dir / "images"
         analyzer.output_dir.mkdir(exist_ok=True, parents=True)
         analyzer.images_dir.mkdir(exist_ok=True, parents=True)
     else:
-        analyzer = PLUSDataAnalyzer(data_dir)
+        analyzer = PLUSDataAnalyzer(data_dir, use_cache=not args.no_cache, workers=args.workers,
+                                    render_charts=not args.no_charts)
     
     # Run analysis
     report_path = analyzer.generate_analysis_report()
@@ -515,7 +715,8 @@ def main():
     if report_path:
         print(f"\n✅ Analysis completed successfully!")
         print(f"📊 Report saved to: {report_path}")
-        print(f"🖼️  Images saved to: {analyzer.images_dir}")
+        if analyzer.render_charts:
+            print(f"🖼️  Images saved to: {analyzer.images_dir}")
         print(f"📖 README available at: {analyzer.output_dir / 'README.md'}")
     else:
         print("❌ Analysis failed. Check the logs for details.")
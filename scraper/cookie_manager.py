@@ -4,15 +4,48 @@ cookie_manager.py - Manages cookies for the PLUS API requests
 
 import os
 import json
+import atexit
+import threading
 import time
 from pathlib import Path
-from typing import Dict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Mapping
 from dotenv import load_dotenv
 from utils import logger
 
 # Load environment variables
 load_dotenv()
 
+@lru_cache(maxsize=1)
+def _load_env_cookies() -> Dict[str, str]:
+    """
+    Read cookies from the environment once per process.
+    COOKIES_JSON holds all cookies as one JSON object; the COOKIE_* variables
+    are still supported as a fallback.
+    """
+    raw = os.getenv("COOKIES_JSON")
+    if raw:
+        try:
+            parsed = json.loads(raw)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, dict):
+            return {str(name): str(value) for name, value in parsed.items()}
+        logger.warning("COOKIES_JSON is not a JSON object, falling back to COOKIE_* variables")
+    
+    cookies = {}
+    if int(os.getenv("COOKIE_COUNT", "0")) > 0:
+        for key, value in os.environ.items():
+            # Skip the counter and anything that isn't a cookie
+            if not key.startswith("COOKIE_") or key == "COOKIE_COUNT":
+                continue
+            
+            # Remove COOKIE_ prefix and convert to lowercase cookie name
+            cookies[key[7:].lower().replace('_', '-')] = value
+    
+    return cookies
+
 class CookieManager:
     """
     Manages cookies for API requests to PLUS
@@ -21,30 +54,21 @@ class CookieManager:
     def __init__(self):
         self.cookies = {}
         self.cookie_file = Path("data/cookies.json")
+        self._dirty = False
+        self._lock = threading.Lock()
         self.load_cookies()
+        
+        # Persist cookies collected from responses once, at shutdown
+        atexit.register(self.flush)
     
     def load_cookies(self) -> Dict[str, str]:
         """
         Load cookies from .env file or cached cookie file
         """
-        # First try to load from .env
-        cookies = {}
+        # First try to load from .env (parsed once and copied, since we mutate it)
+        cookies = dict(_load_env_cookies())
         
-        # Check if we have cookies in environment variables
-        cookie_count = int(os.getenv("COOKIE_COUNT", "0"))
-        
-        if cookie_count > 0:
-            # Load cookies from environment variables
-            for key in os.environ:
-                if key.startswith("COOKIE_"):
-                    # Skip the counter
-                    if key == "COOKIE_COUNT":
-                        continue
-                    
-                    # Extract cookie name and value
-                    cookie_name = key[7:].lower().replace('_', '-')  # Remove COOKIE_ prefix and convert to lowercase
-                    cookies[cookie_name] = os.getenv(key, "")
-            
+        if cookies:
             logger.debug(f"Loaded {len(cookies)} cookies from environment variables")
         
         # If no cookies in .env, try to load from cache file
@@ -67,6 +91,7 @@ class CookieManager:
             }
         
         self.cookies = cookies
+        self._view = MappingProxyType(self.cookies)
         return cookies
     
     def save_cookies(self, cookies: Dict[str, str]) -> None:
@@ -75,12 +100,23 @@ class CookieManager:
         """
         try:
             self.cookie_file.parent.mkdir(exist_ok=True)
-            with open(self.cookie_file, "w", encoding="utf-8") as f:
+            # Write to a temp file and swap it in so the cache is never half-written
+            tmp_file = self.cookie_file.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
                 json.dump(cookies, f, indent=2)
+            os.replace(tmp_file, self.cookie_file)
             logger.debug(f"Saved {len(cookies)} cookies to cache file")
         except Exception as e:
             logger.error(f"Failed to save cookies: {e}")
     
+    def flush(self) -> None:
+        """
+        Save cookies to the cache file if they changed since the last save
+        """
+        if self._dirty:
+            self.save_cookies(self.cookies)
+            self._dirty = False
+    
     def extract_cookies_from_response(self, response) -> Dict[str, str]:
         """
         Extract cookies from a response
@@ -92,21 +128,25 @@ class CookieManager:
         for name, value in response.cookies.items():
             new_cookies[name] = value
         
-        # Update our cookie store with any new cookies
-        self.cookies.update(new_cookies)
-        
-        # Save the updated cookies to cache
+        # Mark the cookies for saving; they are written once by flush()
         if new_cookies:
-            self.save_cookies(self.cookies)
+            # Copy-on-write: views handed out by get_cookies() may be iterated by other
+            # threads, so the published dict is replaced instead of updated in place
+            with self._lock:
+                cookies = dict(self.cookies)
+                cookies.update(new_cookies)
+                self.cookies = cookies
+                self._view = MappingProxyType(cookies)
+                self._dirty = True
             logger.debug(f"Updated {len(new_cookies)} cookies from response")
         
         return new_cookies
     
-    def get_cookies(self) -> Dict[str, str]:
+    def get_cookies(self) -> Mapping[str, str]:
         """
-        Get the current cookie set
+        Get a read-only view of the current cookie set (never modified after it is returned)
         """
-        return self.cookies
+        return self._view
 
 # Create a singleton instance
 cookie_manager = CookieManager()
@@ -5,7 +5,7 @@ database.py - TinyDB database handler for the PLUS scraper
 import os
 import time
 import ujson
-from tinydb import TinyDB, Query
+from tinydb import TinyDB
 from tinydb.middlewares import CachingMiddleware
 from tinydb.storages import JSONStorage
 from pathlib import Path
@@ -17,17 +17,23 @@ class ProductDatabase:
     TinyDB database for storing product information
     """
     
-    def __init__(self, db_path: str = "data/db.json"):
+    # Number of writes CachingMiddleware buffers before flushing to disk
+    WRITE_CACHE_SIZE = 2000
+    
+    def __init__(self, db_path: str = "data/db.json", pretty: bool = False):
         self.db_path = db_path
         # Create directory if it doesn't exist
         Path(db_path).parent.mkdir(exist_ok=True, parents=True)
         
-        # Use CachingMiddleware and ujson for better performance
+        # Use CachingMiddleware for better performance; compact JSON unless a
+        # human-readable export is requested
+        storage = CachingMiddleware(JSONStorage)
+        storage.WRITE_CACHE_SIZE = self.WRITE_CACHE_SIZE
         self.db = TinyDB(
             db_path, 
-            storage=CachingMiddleware(JSONStorage),
-            sort_keys=True,
-            indent=2,
+            storage=storage,
+            sort_keys=pretty,
+            indent=2 if pretty else None,
             ensure_ascii=False
         )
         
@@ -36,6 +42,11 @@ class ProductDatabase:
         self.nutrients = self.db.table('nutrients')
         self.stats = self.db.table('stats')
         
+        # In-memory SKU -> doc_id index so lookups don't scan the products table
+        self._sku_index: Dict[str, int] = {
+            doc["sku"]: doc.doc_id for doc in self.products if doc.get("sku")
+        }
+        
         logger.info(f"Database initialized at {db_path}")
     
     def insert_product(self, product: Dict[str, Any]) -> int:
@@ -50,18 +61,17 @@ class ProductDatabase:
             return -1
         
         # Check if the product already exists
-        Product = Query()
-        existing = self.products.get(Product.sku == sku)
+        doc_id = self._sku_index.get(sku)
         
-        if existing:
+        if doc_id is not None:
             # Update existing product
-            doc_id = existing.doc_id
             self.products.update(product, doc_ids=[doc_id])
             logger.debug(f"Updated product {sku} with ID {doc_id}")
             return doc_id
         else:
             # Insert new product
             doc_id = self.products.insert(product)
+            self._sku_index[sku] = doc_id
             logger.debug(f"Inserted product {sku} with ID {doc_id}")
             return doc_id
     
@@ -73,32 +83,32 @@ class ProductDatabase:
         if not products:
             return []
         
-        to_insert = []
-        to_update = {}
-        doc_ids = []
-        
-        # Check which products already exist
-        Product = Query()
-        skus = [p.get("sku") for p in products if p.get("sku")]
+        # Group the batch by SKU once (first occurrence wins)
+        by_sku: Dict[str, Dict[str, Any]] = {}
+        for product in products:
+            sku = product.get("sku")
+            if sku:
+                by_sku.setdefault(sku, product)
         
-        for sku in skus:
-            existing = self.products.get(Product.sku == sku)
-            if existing:
-                to_update[existing.doc_id] = next((p for p in products if p.get("sku") == sku), {})
-            else:
-                product = next((p for p in products if p.get("sku") == sku), {})
-                if product:
-                    to_insert.append(product)
+        # Split into new and existing products using the SKU index
+        to_insert = [p for sku, p in by_sku.items() if sku not in self._sku_index]
+        to_update = {self._sku_index[sku]: p for sku, p in by_sku.items() if sku in self._sku_index}
+        doc_ids = []
         
         # Insert new products in batch
         if to_insert:
             new_ids = self.products.insert_multiple(to_insert)
+            for product, doc_id in zip(to_insert, new_ids):
+                self._sku_index[product["sku"]] = doc_id
             doc_ids.extend(new_ids)
         
-        # Update existing products
-        for doc_id, product in to_update.items():
-            self.products.update(product, doc_ids=[doc_id])
-            doc_ids.append(doc_id)
+        # Update existing products in a single pass over the table
+        if to_update:
+            def apply_updates(doc):
+                doc.update(by_sku[doc["sku"]])
+            
+            self.products.update(apply_updates, doc_ids=list(to_update))
+            doc_ids.extend(to_update)
         
         logger.info(f"Saved {len(doc_ids)} products to database")
         return doc_ids
@@ -111,18 +121,20 @@ class ProductDatabase:
         if not nutrients:
             return []
         
-        # Format nutrients data
-        nutrients_data = []
-        for nutrient in nutrients:
-            nutrients_data.append({
+        # Format nutrients data (one timestamp for the whole batch)
+        created_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        nutrients_data = [
+            {
                 "product_id": product_id,
                 "sku": sku,
                 "name": nutrient.get("name", ""),
                 "value": nutrient.get("value", "0"),
                 "unit": nutrient.get("unit", ""),
                 "parent_code": nutrient.get("parent_code", ""),
-                "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            })
+                "created_at": created_at
+            }
+            for nutrient in nutrients
+        ]
         
         # Insert nutrients in batch
         doc_ids = self.nutrients.insert_multiple(nutrients_data)
@@ -133,9 +145,7 @@ class ProductDatabase:
         """
         Get a set of SKUs that have already been processed
         """
-        Product = Query()
-        results = self.products.search(Product.sku.exists())
-        return {doc.get("sku") for doc in results if doc.get("sku")}
+        return set(self._sku_index)
     
     def save_stats(self, stats: Dict[str, Any]) -> int:
         """
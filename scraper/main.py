@@ -6,12 +6,11 @@ import os
 import time
 import argparse
 import sys
-from pathlib import Path
 from typing import Dict, Any, List, Optional, Set
 from dotenv import load_dotenv
 
 # Local imports
-from utils import logger, create_checkpoint, load_checkpoint
+from utils import logger, create_checkpoint, load_checkpoint, load_retry_items
 from sitemap_parser import SitemapParser
 from product_scraper import ProductScraper
 from database import ProductDatabase
@@ -21,9 +20,9 @@ from cookie_manager import cookie_manager  # Importeer cookie_manager
 # Load environment variables
 load_dotenv()
 
-def parse_args():
+def parse_args(argv: Optional[List[str]] = None):
     """
-    Parse command line arguments
+    Parse command line arguments (sys.argv[1:] when argv is None)
     """
     parser = argparse.ArgumentParser(description="PLUS Product Scraper")
     
@@ -37,11 +36,15 @@ def parse_args():
     parser.add_argument("--limit", type=int, help="Limit the number of products to process")
     parser.add_argument("--skip", type=int, default=0, help="Skip the first N products")
     parser.add_argument("--batch-size", type=int, default=10, help="Number of products to process in a batch")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MAX_CONCURRENT_REQUESTS", "5")),
+                        help="Number of products fetched concurrently (default: MAX_CONCURRENT_REQUESTS)")
     parser.add_argument("--sku", type=str, help="Process only a specific SKU")
-    parser.add_argument("--retry", action="store_true", help="Process items in retry.json")
+    parser.add_argument("--retry", action="store_true", help="Process items in retry.ndjson")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Re-fetch products completed by an interrupted run")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Set default mode if none selected
     if not (args.sitemap or args.scrape or args.all or args.retry or args.sku):
@@ -49,12 +52,12 @@ def parse_args():
     
     return args
 
-def sitemap_task(args) -> List[Dict[str, str]]:
+def sitemap_task(args, sitemap_parser: Optional[SitemapParser] = None) -> List[Dict[str, str]]:
     """
     Parse and cache the sitemap
     """
     logger.info("Starting sitemap parsing task")
-    sitemap_parser = SitemapParser()
+    sitemap_parser = sitemap_parser or SitemapParser()
     
     # Parse the sitemap
     product_urls = sitemap_parser.get_urls(force_refresh=args.force_refresh)
@@ -62,42 +65,35 @@ def sitemap_task(args) -> List[Dict[str, str]]:
     
     return product_urls
 
-def scrape_task(args, product_urls: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+def scrape_task(args, sitemap_parser: Optional[SitemapParser] = None) -> Dict[str, Any]:
     """
     Scrape product details
     """
     logger.info("Starting product scraping task")
     
-    # Initialize components
-    sitemap_parser = SitemapParser()
-    product_scraper = ProductScraper()
+    # Initialize components; a parser shared with sitemap_task reuses the URLs it already loaded
+    sitemap_parser = sitemap_parser or SitemapParser()
+    product_scraper = ProductScraper(resume=not args.no_resume)
     db = ProductDatabase()
     
-    # Get product URLs if not provided
-    if not product_urls:
-        product_urls = sitemap_parser.get_urls()
-    
     # Get processed SKUs from database
     processed_skus = db.get_processed_skus()
     logger.info(f"Found {len(processed_skus)} already processed SKUs in database")
     
     # Filter to unprocessed products
     if args.sku:
-        # Process only the specified SKU
+        # Process only the specified SKU (the full URL list is only needed here)
+        product_urls = sitemap_parser.get_urls()
         urls_to_process = [url for url in product_urls if url.get("sku") == args.sku]
         if not urls_to_process:
             urls_to_process = [{"sku": args.sku, "url": "", "lastmod": ""}]
     elif args.retry:
         # Process retry items
-        retry_file = Path("data/retry.json")
-        if not retry_file.exists():
-            logger.warning("No retry file found")
+        retry_items = load_retry_items()
+        if not retry_items:
+            logger.warning("No retry items found")
             return {"processed": 0, "failed": 0, "skipped": 0}
         
-        import json
-        with open(retry_file, "r", encoding="utf-8") as f:
-            retry_items = json.load(f)
-        
         urls_to_process = []
         for item in retry_items:
             data = item.get("data", {})
@@ -138,21 +134,27 @@ def scrape_task(args, product_urls: Optional[List[Dict[str, str]]] = None) -> Di
     
     # Process products in batches
     batch_size = args.batch_size
+    workers = max(1, args.workers)
     products_to_save = []
+    finished = False
     
     try:
-        for i, url_info in enumerate(urls_to_process[start_idx:], start=start_idx):
-            sku = url_info.get("sku", "")
-            url = url_info.get("url", "")
-            
-            if not sku:
-                logger.warning(f"Skipping item without SKU: {url}")
-                stats["skipped"] += 1
-                continue
-            
-            try:
-                # Process the product
-                product_data = product_scraper.process_product(sku, url)
+        # Products are fetched concurrently; results arrive in order on this thread so
+        # database writes and checkpoints stay sequential
+        remaining = urls_to_process[start_idx:]
+        results = product_scraper.process_many(
+            ((url_info.get("sku", ""), url_info.get("url", "")) for url_info in remaining),
+            workers=workers
+        )
+        try:
+            for i, (url_info, product_data) in enumerate(zip(remaining, results), start=start_idx):
+                sku = url_info.get("sku", "")
+                url = url_info.get("url", "")
+                
+                if not sku:
+                    logger.warning(f"Skipping item without SKU: {url}")
+                    stats["skipped"] += 1
+                    continue
                 
                 if product_data:
                     products_to_save.append(product_data)
@@ -172,10 +174,9 @@ def scrape_task(args, product_urls: Optional[List[Dict[str, str]]] = None) -> Di
                 # Display progress
                 progress = (i + 1) / len(urls_to_process) * 100
                 logger.info(f"Progress: {i+1}/{len(urls_to_process)} ({progress:.1f}%) - SKU: {sku}")
-                
-            except Exception as e:
-                logger.error(f"Error processing SKU {sku}: {e}")
-                stats["failed"] += 1
+        finally:
+            results.close()
+        finished = True
     
     except KeyboardInterrupt:
         logger.warning("Process interrupted by user")
@@ -185,6 +186,12 @@ def scrape_task(args, product_urls: Optional[List[Dict[str, str]]] = None) -> Di
         if products_to_save:
             db.insert_products(products_to_save)
         
+        # Persist completed SKUs so a resumed run can skip them; a finished full run starts fresh next time
+        if finished and not args.sku and not args.retry:
+            product_scraper.clear_checkpoint()
+        else:
+            product_scraper.save_checkpoint()
+        
         # Save statistics
         db.save_stats(stats)
         
@@ -199,19 +206,19 @@ def scrape_task(args, product_urls: Optional[List[Dict[str, str]]] = None) -> Di
     logger.info(f"Scraping completed: {stats['processed']} processed, {stats['failed']} failed, {stats['skipped']} skipped")
     return stats
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """
-    Main entry point
+    Main entry point; argv lets other scripts run the scraper in-process
     """
     # Parse command line arguments
-    args = parse_args()
+    args = parse_args(argv)
     
     # Set debug mode if requested
     if args.debug:
         logger.setLevel("DEBUG")
     
     # Start time
-    start_time = time.time()
+    start_time = time.monotonic()
     logger.info("PLUS Product Scraper")
     logger.info("-" * 40)
     
@@ -223,7 +230,7 @@ def main():
         # Als er een SKU is opgegeven, gebruik deze direct
         if args.sku:
             logger.info(f"Processing single SKU: {args.sku}")
-            product_scraper = ProductScraper()
+            product_scraper = ProductScraper(resume=False)
             product_data = product_scraper.process_product(args.sku)
             
             if product_data:
@@ -237,13 +244,13 @@ def main():
                 
         else:
             # Run the normal requested tasks
+            # One parser for both tasks so the scrape reuses the URLs the sitemap task loaded
+            sitemap_parser = SitemapParser()
             if args.sitemap or args.all:
-                product_urls = sitemap_task(args)
-            else:
-                product_urls = None
+                sitemap_task(args, sitemap_parser)
             
             if args.scrape or args.all or args.retry:
-                stats = scrape_task(args, product_urls)
+                stats = scrape_task(args, sitemap_parser)
     
     except Exception as e:
         logger.error(f"Error in main process: {e}")
@@ -252,7 +259,7 @@ def main():
         return 1
     
     # End time and summary
-    elapsed_time = time.time() - start_time
+    elapsed_time = time.monotonic() - start_time
     logger.info(f"Total execution time: {elapsed_time:.2f} seconds")
     return 0
 
@@ -1,12 +1,16 @@
 """
-migrate_db.py - Creates a TinyDB database from individual product JSON files
+migrate_db.py - Creates or incrementally updates a TinyDB database from individual product JSON files
 """
 import os
 import sys
-import json
+import ujson
 import logging
+import argparse
 from pathlib import Path
-from tinydb import TinyDB, Query
+from concurrent.futures import ProcessPoolExecutor
+from tinydb import TinyDB
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
 from datetime import datetime
 
 # Configure logging
@@ -17,8 +21,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def create_database():
-    """Create a TinyDB database from individual product JSON files"""
+# Minimum number of changed files before parsing is spread over worker processes
+PARALLEL_MIN_FILES = 5000
+
+def load_product_file(product_file: Path):
+    """Parse one product JSON file, returning (path, data, error)"""
+    try:
+        return product_file, ujson.loads(product_file.read_bytes()), None
+    except Exception as e:
+        return product_file, None, e
+
+def create_database(force: bool = False):
+    """Create or incrementally update a TinyDB database from individual product JSON files"""
     # Use absolute paths to avoid working directory issues
     script_dir = Path(__file__).parent.absolute()
     products_dir = script_dir / "data" / "products"
@@ -36,33 +50,66 @@ def create_database():
     # Create the database directory if it doesn't exist
     db_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Initialize the TinyDB database
-    db = TinyDB(db_path)
+    # Initialize the TinyDB database (cached so the migration is written once)
+    db = TinyDB(db_path, storage=CachingMiddleware(JSONStorage))
     products_table = db.table('products')
     nutrients_table = db.table('nutrients')
     
-    # Clear existing data
-    products_table.truncate()
-    nutrients_table.truncate()
+    # Full rebuild only when forced; otherwise only changed files are re-ingested
+    if force:
+        products_table.truncate()
+        nutrients_table.truncate()
     
-    # Process each product JSON file
-    product_files = list(products_dir.glob("*.json"))
+    # Process each product JSON file (one directory pass; DirEntry caches its stat())
+    with os.scandir(products_dir) as entries:
+        product_entries = [entry for entry in entries
+                           if entry.name.endswith(".json") and not entry.name.startswith(".") and entry.is_file()]
+    product_files = [Path(entry.path) for entry in product_entries]
     
     if not product_files:
         logger.error(f"No product JSON files found in {products_dir}")
+        db.close()
         return False
     
-    logger.info(f"Processing {len(product_files)} product files...")
+    # Skip files whose modification time matches the one recorded at the last migration.
+    # Rows are tracked by source filename, which need not match the SKU inside the file;
+    # rows from before this bookkeeping have no source_file and are replaced once
+    known = {doc.get('source_file'): doc.get('source_mtime_ns') for doc in products_table}
+    file_mtimes = {}
+    changed_files = []
+    for product_file, entry in zip(product_files, product_entries):
+        mtime = entry.stat().st_mtime_ns
+        file_mtimes[product_file] = mtime
+        if known.get(product_file.name, -1) != mtime:
+            changed_files.append(product_file)
+    
+    # Rows whose source file has been deleted since the last migration
+    stale_files = set(known) - {product_file.name for product_file in product_files}
     
+    skipped_count = len(product_files) - len(changed_files)
+    logger.info(f"Processing {len(changed_files)} product files ({skipped_count} unchanged)...")
+    
+    all_products = []
+    all_nutrients = []
     processed_count = 0
-    nutrient_count = 0
     
-    for product_file in product_files:
+    # Fallback timestamp for products without extracted_at, formatted once per run
+    migrated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    # Parse large batches in parallel; for small ones the pool start-up and pickling cost more
+    # than they save. Database writes stay on this process
+    if len(changed_files) >= PARALLEL_MIN_FILES and (os.cpu_count() or 1) > 1:
+        with ProcessPoolExecutor() as executor:
+            parsed_files = list(executor.map(load_product_file, changed_files, chunksize=64))
+    else:
+        parsed_files = [load_product_file(product_file) for product_file in changed_files]
+    
+    for product_file, product_data, error in parsed_files:
+        if error is not None:
+            logger.error(f"Error processing {product_file.name}: {error}")
+            continue
+        
         try:
-            # Load product data
-            with open(product_file, 'r', encoding='utf-8') as f:
-                product_data = json.load(f)
-            
             # Extract SKU from filename or from data
             if 'sku' not in product_data:
                 # Try to extract SKU from filename (format: "123456_ProductName.json")
@@ -79,31 +126,48 @@ def create_database():
             
             # Add timestamp if not present
             if 'extracted_at' not in product_data:
-                product_data['extracted_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                product_data['extracted_at'] = migrated_at
+            
+            # Remember the source file version for the next incremental run
+            product_data['source_file'] = product_file.name
+            product_data['source_mtime_ns'] = file_mtimes[product_file]
             
-            # Insert product into database
-            product_id = products_table.insert(product_data)
+            # Queue product for the bulk insert
+            all_products.append(product_data)
             
             # Process nutrients
             if nutrients:
                 for nutrient in nutrients:
-                    # Add SKU to each nutrient
+                    # Add SKU and source file to each nutrient
                     nutrient['sku'] = product_data['sku']
-                    nutrients_table.insert(nutrient)
-                    nutrient_count += 1
+                    nutrient['source_file'] = product_file.name
+                all_nutrients.extend(nutrients)
             
             processed_count += 1
             
             # Log progress periodically
             if processed_count % 50 == 0:
-                logger.info(f"Processed {processed_count}/{len(product_files)} products...")
+                logger.info(f"Processed {processed_count}/{len(changed_files)} products...")
                 
         except Exception as e:
             logger.error(f"Error processing {product_file.name}: {e}")
     
+    # Replace the stored rows of re-ingested products and drop deleted ones in one pass per table
+    removed_files = {product_file.name for product_file in changed_files} | stale_files
+    if removed_files and not force:
+        products_table.remove(lambda doc: doc.get('source_file') in removed_files)
+        nutrients_table.remove(lambda doc: doc.get('source_file') in removed_files)
+    
+    # Write everything in one batch per table; the cache flushes once on close
+    products_table.insert_multiple(all_products)
+    nutrients_table.insert_multiple(all_nutrients)
+    db.close()
+    
     logger.info(f"Database creation completed:")
-    logger.info(f"- Added {processed_count} products")
-    logger.info(f"- Added {nutrient_count} nutrient entries")
+    logger.info(f"- Added or updated {processed_count} products")
+    logger.info(f"- Added {len(all_nutrients)} nutrient entries")
+    logger.info(f"- Skipped {skipped_count} unchanged products")
+    logger.info(f"- Removed {len(stale_files - {None})} products without a source file")
     
     # Create the analysis directory
     analysis_path = Path("data/analysis")
@@ -112,5 +176,9 @@ def create_database():
     return True
 
 if __name__ == "__main__":
-    success = create_database()
+    parser = argparse.ArgumentParser(description="Build the TinyDB database from product JSON files")
+    parser.add_argument("--force", action="store_true", help="Rebuild the database from scratch instead of only ingesting changed files")
+    args = parser.parse_args()
+    
+    success = create_database(force=args.force)
     sys.exit(0 if success else 1)
@@ -4,13 +4,22 @@ product_scraper.py - Scrapes product details from PLUS
 
 import os
 import time
-import json
+import hashlib
+import threading
+import ujson
 import requests
+from collections import deque
+from http.cookiejar import DefaultCookiePolicy
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
 from pathlib import Path
-from typing import Dict, Any, Optional, List, Union, Set
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Union, Set, Iterable, Iterator, Tuple
 from utils import (
-    logger, exponential_backoff, get_plus_headers, save_to_retry,
-    create_checkpoint, load_checkpoint, format_filename
+    logger, get_plus_headers, save_to_retry,
+    create_checkpoint, load_checkpoint, clear_checkpoint, format_filename, TokenBucket
 )
 from proxy_manager import proxy_manager
 from cookie_manager import cookie_manager
@@ -20,25 +29,146 @@ class ProductScraper:
     Scrapes product details using the PLUS API
     """
     
-    def __init__(self):
+    # Vaste headers gebaseerd op de werkende PowerShell request (zonder referer en csrf-token)
+    _STATIC_HEADERS = MappingProxyType({
+        "authority": "www.plus.nl",
+        "method": "POST",
+        "path": "/screenservices/ECP_Product_CW/ProductDetails/PDPContent/DataActionGetProductDetailsAndAgeInfo",
+        "scheme": "https",
+        "accept": "application/json",
+        "accept-language": "nl-NL,nl;q=0.9,en-US;q=0.8,en;q=0.7",
+        "content-type": "application/json; charset=UTF-8",
+        "origin": "https://www.plus.nl",
+        "outsystems-locale": "nl-NL",
+        "priority": "u=1, i",
+        "sec-ch-ua": "\"Not A(Brand\";v=\"8\", \"Chromium\";v=\"132\", \"Opera GX\";v=\"117\"",
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": "\"Windows\"",
+        "sec-fetch-dest": "empty",
+        "sec-fetch-mode": "cors",
+        "sec-fetch-site": "same-origin",
+        # Compressed responses; includes br/zstd when the brotli/zstandard packages are installed
+        **make_headers(accept_encoding=True),
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36 OPR/117.0.0.0"
+    })
+    
+    # Placeholders marking where SKU and ProductName go in the serialized payload template
+    _SKU_MARKER = "__PLUS_SKU__"
+    _NAME_MARKER = "__PLUS_PRODUCT_NAME__"
+    
+    # Response statuses worth retrying (rate limited or server-side failures)
+    RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+    
+    # Completed SKUs are checkpointed after this many new products
+    CHECKPOINT_INTERVAL = 100
+    
+    def __init__(self, resume: bool = True):
         self.api_url = "https://www.plus.nl/screenservices/ECP_Product_CW/ProductDetails/PDPContent/DataActionGetProductDetailsAndAgeInfo"
         self.timeout = int(os.getenv("REQUEST_TIMEOUT", "30"))
         self.max_retries = int(os.getenv("MAX_RETRIES", "3"))
         self.backoff_factor = float(os.getenv("BACKOFF_FACTOR", "2"))
         self.request_delay = float(os.getenv("REQUEST_DELAY", ".25"))
-        self.last_request_time = 0
+        self.request_burst = int(os.getenv("REQUEST_BURST", "1"))
+        # Shared by all worker threads: one request per request_delay on average, short bursts allowed
+        self.rate_limiter = TokenBucket(
+            rate=1 / self.request_delay if self.request_delay > 0 else 0,
+            burst=self.request_burst
+        )
         self.csrf_token = os.getenv("PLUS_CSRF_TOKEN", "")
         
         if not self.csrf_token:
             raise ValueError("PLUS_CSRF_TOKEN environment variable is required")
+        
+        # One persistent session so TCP/TLS connections to plus.nl are reused across SKUs
+        self.session = requests.Session()
+        # urllib3 only retries failed connects (nothing was sent yet); 429/5xx responses are
+        # retried by fetch_product so every attempt is rate limited and picks a fresh proxy
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            backoff_factor=self.backoff_factor,
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=16, pool_maxsize=32)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self._STATIC_HEADERS)
+        self.session.headers["x-csrftoken"] = self.csrf_token
+        # cookie_manager is the only cookie source; a session jar would resend Set-Cookie values twice
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        
+        # Build and serialize the large payload literal once; each request only splices in SKU/ProductName
+        self._payload_template = self._build_payload_template()
+        self._payload_parts = self._split_payload_template()
+        
+        # Completed SKU -> saved filename, restored from an interrupted run when the request
+        # configuration is unchanged; with resume enabled those products are not re-fetched.
+        # The checkpoint is cleared once a scrape run finishes normally
+        self.resume = resume
+        self.config_hash = hashlib.sha256(
+            ujson.dumps([self.api_url, self._payload_template], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        self.completed: Dict[str, str] = {}
+        self._completed_lock = threading.Lock()
+        self._unsaved_completions = 0
+        checkpoint = load_checkpoint("completed") or {}
+        if checkpoint.get("config_hash") == self.config_hash:
+            self.completed = dict(checkpoint.get("completed", {}))
+            if self.completed and resume:
+                logger.info(f"Loaded {len(self.completed)} completed SKUs from checkpoint")
     
-    def _build_payload(self, sku: str, product_name: str = "") -> Dict[str, Any]:
+    def _split_payload_template(self) -> Tuple[bytes, bytes, bytes]:
+        """
+        Serialize the payload template once and split it around the SKU and ProductName values
         """
-        Build the API request payload (exact match from the JavaScript fetch example)
+        template = self._payload_template
+        screen_data = template["screenData"]
+        body = self._dumps({
+            **template,
+            "screenData": {
+                **screen_data,
+                "variables": {
+                    **screen_data["variables"],
+                    "SKU": self._SKU_MARKER,
+                    "ProductName": self._NAME_MARKER
+                }
+            }
+        })
+        prefix, rest = body.split(self._SKU_MARKER)
+        middle, suffix = rest.split(self._NAME_MARKER)
+        return prefix.encode("utf-8"), middle.encode("utf-8"), suffix.encode("utf-8")
+    
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        """
+        Serialize to JSON the way the API request body is sent
+        """
+        return ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False)
+    
+    def _build_payload(self, sku: str, product_name: str = "") -> bytes:
+        """
+        Build the API request body by splicing the JSON-escaped SKU and name into the
+        pre-serialized template
+        """
+        prefix, middle, suffix = self._payload_parts
+        return b"".join((
+            prefix,
+            self._dumps(sku)[1:-1].encode("utf-8"),
+            middle,
+            self._dumps(product_name or f"product-{sku}")[1:-1].encode("utf-8"),
+            suffix
+        ))
+    
+    @staticmethod
+    def _build_payload_template() -> Dict[str, Any]:
+        """
+        API request payload template (exact match from the JavaScript fetch example)
         """
         # Gebruik het exacte formaat dat in de JavaScript fetch wordt gebruikt
-        product_slug = product_name or f"product-{sku}"
-        
         return {
             "versionInfo": {
                 "moduleVersion": "6uc+XDsRynmQ7JQS4jOSaQ",
@@ -133,11 +263,11 @@ class ProductScraper:
                     "_isPhoneInDataFetchStatus": 1,
                     "OneWelcomeUserId": "",
                     "_oneWelcomeUserIdInDataFetchStatus": 1,
-                    "SKU": sku,
+                    "SKU": "",
                     "_sKUInDataFetchStatus": 1,
                     "TotalCartItems": 0,
                     "_totalCartItemsInDataFetchStatus": 1,
-                    "ProductName": product_slug,
+                    "ProductName": "",
                     "_productNameInDataFetchStatus": 1
                 }
             }
@@ -150,15 +280,36 @@ class ProductScraper:
         if not product_url or not product_url.startswith("http"):
             return "https://www.plus.nl"
         return product_url
-    @exponential_backoff(max_retries=3, initial_delay=1.0)
+    
     def fetch_product(self, sku: str, product_url: str = "") -> Dict[str, Any]:
         """
-        Fetch product details using the PLUS API
+        Fetch product details using the PLUS API, retrying 429/5xx responses and timeouts
+        with exponential backoff (at least Retry-After seconds when the server sends it)
+        """
+        delay = self.backoff_factor
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._request_product(sku, product_url)
+            except (requests.HTTPError, requests.ReadTimeout) as e:
+                response = getattr(e, "response", None)
+                transient = response is None or response.status_code in self.RETRY_STATUSES
+                if not transient or attempt == self.max_retries:
+                    raise
+                
+                wait = delay
+                retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+                if retry_after.isdigit():
+                    wait = max(wait, float(retry_after))
+                logger.warning(f"Retry {attempt + 1}/{self.max_retries} for SKU {sku} after {wait:.2f}s: {e}")
+                time.sleep(wait)
+                delay *= 2
+    
+    def _request_product(self, sku: str, product_url: str = "") -> Dict[str, Any]:
+        """
+        Send a single product API request
         """
         # Respect rate limiting
-        time_since_last_request = time.time() - self.last_request_time
-        if time_since_last_request < self.request_delay:
-            time.sleep(self.request_delay - time_since_last_request)
+        self.rate_limiter.acquire()
         
         # Build the product URL for referrer if not provided
         if not product_url:
@@ -170,42 +321,19 @@ class ProductScraper:
         
         logger.info(f"Fetching product SKU: {sku}")
         
-        # Headers gebaseerd op de werkende PowerShell request
-        headers = {
-            "authority": "www.plus.nl",
-            "method": "POST",
-            "path": "/screenservices/ECP_Product_CW/ProductDetails/PDPContent/DataActionGetProductDetailsAndAgeInfo",
-            "scheme": "https",
-            "accept": "application/json",
-            "accept-language": "nl-NL,nl;q=0.9,en-US;q=0.8,en;q=0.7",
-            "content-type": "application/json; charset=UTF-8",
-            "origin": "https://www.plus.nl",
-            "outsystems-locale": "nl-NL",
-            "priority": "u=1, i",
-            "referer": referrer,
-            "sec-ch-ua": "\"Not A(Brand\";v=\"8\", \"Chromium\";v=\"132\", \"Opera GX\";v=\"117\"",
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": "\"Windows\"",
-            "sec-fetch-dest": "empty",
-            "sec-fetch-mode": "cors",
-            "sec-fetch-site": "same-origin",
-            "x-csrftoken": self.csrf_token,
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36 OPR/117.0.0.0"
-        }
+        # Alleen de referer verschilt per request; de rest staat al op de session
+        headers = {"referer": referrer}
           # Gebruik de cookie manager om cookies op te halen
         cookies = cookie_manager.get_cookies()
-        response = requests.post(
+        response = self.session.post(
             self.api_url,
-            json=payload,
+            data=payload,
             headers=headers,
             cookies=cookies,
             proxies=proxies,
             timeout=self.timeout
         )
         
-        # Update last request time
-        self.last_request_time = time.time()
-        
         # Bewaar eventuele nieuwe cookies uit de response
         if response.status_code == 200:
             cookie_manager.extract_cookies_from_response(response)
@@ -219,7 +347,7 @@ class ProductScraper:
         
         # Handle the response
         response.raise_for_status()
-        data = response.json()
+        data = ujson.loads(response.content)
         
         # Check if we got valid data
         if "data" not in data:
@@ -235,17 +363,20 @@ class ProductScraper:
         product_out = data.get("ProductOut", {})
         overview = product_out.get("Overview", {})
         
-        # Extract nutrients information
-        nutrients = []
+        # Extract nutrients information (each nested dict is looked up once)
         nutrient_data = product_out.get("Nutrient", {})
-        base_uom = nutrient_data.get("Base", {}).get("UoM", "")
-        base_value = nutrient_data.get("Base", {}).get("Value", 0)
+        base = nutrient_data.get("Base", {})
+        base_uom = base.get("UoM", "")
+        base_value = base.get("Value", 0)
         
+        nutrients = []
+        append_nutrient = nutrients.append
         for nutrient in nutrient_data.get("Nutrients", {}).get("List", []):
-            nutrients.append({
+            quantity = nutrient.get("QuantityContained", {})
+            append_nutrient({
                 "name": nutrient.get("Description", ""),
-                "value": nutrient.get("QuantityContained", {}).get("Value", "0"),
-                "unit": nutrient.get("QuantityContained", {}).get("UoM", ""),
+                "value": quantity.get("Value", "0"),
+                "unit": quantity.get("UoM", ""),
                 "parent_code": nutrient.get("ParentCode", "")
             })
         
@@ -283,17 +414,74 @@ class ProductScraper:
         filename = f"{sku}_{name}.json"
         file_path = product_dir / filename
         
-        # Save the data
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(product_data, f, indent=2, ensure_ascii=False)
+        # Save the data via a temporary file so a crash never leaves a truncated product file
+        tmp_path = file_path.with_suffix(".json.tmp")
+        tmp_path.write_bytes(
+            ujson.dumps(product_data, indent=2, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+        )
+        os.replace(tmp_path, file_path)
         
         logger.debug(f"Saved product {sku} to {file_path}")
         return str(file_path)
     
+    def _load_completed_product(self, sku: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the saved data of a product completed in an earlier run, if still on disk
+        """
+        filename = self.completed.get(sku)
+        if not filename:
+            return None
+        try:
+            return ujson.loads((Path("data/products") / filename).read_bytes())
+        except (OSError, ValueError):
+            return None
+    
+    def _mark_completed(self, sku: str, file_path: str) -> None:
+        """
+        Record a saved product and checkpoint every CHECKPOINT_INTERVAL completions
+        """
+        with self._completed_lock:
+            self.completed[sku] = Path(file_path).name
+            self._unsaved_completions += 1
+            if self._unsaved_completions >= self.CHECKPOINT_INTERVAL:
+                self._write_completed_checkpoint()
+    
+    def _write_completed_checkpoint(self) -> None:
+        """
+        Write the completed SKUs checkpoint (caller holds _completed_lock)
+        """
+        create_checkpoint(len(self.completed), checkpoint_type="completed",
+                          extra={"config_hash": self.config_hash, "completed": self.completed})
+        self._unsaved_completions = 0
+    
+    def save_checkpoint(self) -> None:
+        """
+        Flush completed SKUs that were not checkpointed yet
+        """
+        with self._completed_lock:
+            if self._unsaved_completions:
+                self._write_completed_checkpoint()
+    
+    def clear_checkpoint(self) -> None:
+        """
+        Forget completed SKUs after a run finished, so the next run fetches fresh data
+        """
+        with self._completed_lock:
+            self.completed = {}
+            self._unsaved_completions = 0
+            clear_checkpoint("completed")
+    
     def process_product(self, sku: str, product_url: str = "") -> Optional[Dict[str, Any]]:
         """
         Process a product: fetch, extract data, and save
+        Products completed in an earlier run are read back from disk instead of fetched
         """
+        if self.resume:
+            product_data = self._load_completed_product(sku)
+            if product_data is not None:
+                logger.info(f"Skipping already completed product SKU: {sku}")
+                return product_data
+        
         try:
             # Fetch the product data
             response_data = self.fetch_product(sku, product_url)
@@ -302,7 +490,8 @@ class ProductScraper:
             product_data = self.extract_product_data(response_data)
             
             # Save to file
-            self.save_product_json(product_data, sku)
+            file_path = self.save_product_json(product_data, sku)
+            self._mark_completed(sku, file_path)
             
             logger.info(f"Successfully processed product SKU: {sku}")
             return product_data
@@ -311,3 +500,34 @@ class ProductScraper:
             logger.error(f"Error processing product SKU {sku}: {e}")
             save_to_retry({"sku": sku, "url": product_url}, str(e))
             return None
+    
+    def process_many(self, items: Iterable[Tuple[str, str]], workers: int = 20) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Process (sku, product_url) pairs on a thread pool, yielding each result in input order
+        At most twice the worker count is in flight, so closing the generator early only
+        waits for the requests already running; items without a SKU yield None
+        """
+        workers = max(1, workers)
+        pending = deque()
+        
+        def run(sku: str, product_url: str) -> Optional[Dict[str, Any]]:
+            if not sku:
+                return None
+            try:
+                return self.process_product(sku, product_url)
+            except Exception as e:
+                logger.error(f"Error processing product SKU {sku}: {e}")
+                return None
+        
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for sku, product_url in items:
+                pending.append(executor.submit(run, sku, product_url))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
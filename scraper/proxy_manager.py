@@ -5,28 +5,51 @@ proxy_manager.py - Manages proxies for the PLUS scraper
 import os
 import random
 import time
+import threading
 import requests
-from typing import Dict, List, Optional, Union, Tuple
+from collections import deque
+from typing import Dict, Optional, Tuple, Deque
 from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from fp.fp import FreeProxy
-from utils import logger, exponential_backoff
+from utils import logger
 
 # Load environment variables
 load_dotenv()
 
+class ProxyEntry:
+    """
+    A free proxy with its failure count and last use time
+    """
+    
+    __slots__ = ("url", "fail_count", "last_used")
+    
+    def __init__(self, url: str, fail_count: int = 0, last_used: float = 0.0):
+        self.url = url
+        self.fail_count = fail_count
+        self.last_used = last_used
+
 class ProxyManager:
     """
     Manages proxy rotation for web scraping
     Supports free proxies, ScraperAPI, Smartproxy, and AWS Gateway
     """
     
+    # Free proxy refresh: keep up to MAX_PROXIES working proxies out of
+    # PROXY_CANDIDATES probed with VALIDATION_WORKERS threads
+    MAX_PROXIES = 10
+    PROXY_CANDIDATES = 30
+    VALIDATION_WORKERS = 10
+    
     def __init__(self):
         self.use_proxy = os.getenv("USE_PROXY", "false").lower() == "true"
         self.proxy_type = os.getenv("PROXY_TYPE", "free").lower()
         self.proxy_api_key = os.getenv("PROXY_API_KEY", "")
-        self.proxy_list: List[Dict[str, Union[str, float]]] = []
-        self.proxy_index = 0
+        # Proxy entries keyed by URL plus a rotation queue of the same URLs
+        self.proxies: Dict[str, ProxyEntry] = {}
+        self.proxy_rotation: Deque[str] = deque()
+        self._lock = threading.RLock()  # Scrape worker threads share this manager
         self.last_refresh_time = 0
         self.refresh_interval = 300  # 5 minutes refresh interval for free proxies
         
@@ -40,7 +63,7 @@ class ProxyManager:
         if not self.use_proxy:
             return
         
-        self.last_refresh_time = time.time()
+        self.last_refresh_time = time.monotonic()
         
         if self.proxy_type == "free":
             self._refresh_free_proxies()
@@ -56,43 +79,38 @@ class ProxyManager:
         else:
             logger.warning(f"Unknown proxy type: {self.proxy_type}")
             
-        logger.info(f"Refreshed proxies: {len(self.proxy_list)} {'proxies' if self.proxy_list else ''} available")
+        logger.info(f"Refreshed proxies: {len(self.proxies)} {'proxies' if self.proxies else ''} available")
     
     def _refresh_free_proxies(self) -> None:
         """
         Refresh the list of free proxies using FreeProxy library
         """
         try:
-            # Get a list of free proxies from various sources
+            # Fetch the candidate list once and validate a random sample concurrently
             fp = FreeProxy(rand=True, timeout=2, https=True)
-            new_proxies = []
+            candidates = [f"http://{address}" for address in fp.get_proxy_list(repeat=False)]
+            random.shuffle(candidates)
+            candidates = candidates[:self.PROXY_CANDIDATES]
+            
+            with ThreadPoolExecutor(max_workers=self.VALIDATION_WORKERS) as executor:
+                results = executor.map(self._validate_proxy, candidates)
+                valid_urls = [url for url, ok in zip(candidates, results) if ok]
             
-            # Collect 10 proxies
-            for _ in range(10):
-                try:
-                    proxy = fp.get()
-                    if proxy and self._validate_proxy(proxy):
-                        new_proxies.append({
-                            "url": proxy,
-                            "fail_count": 0,
-                            "last_used": 0
-                        })
-                except Exception:
-                    continue
+            new_proxies = {proxy: ProxyEntry(proxy) for proxy in valid_urls[:self.MAX_PROXIES]}
             
             if new_proxies:
-                self.proxy_list = new_proxies
-                self.proxy_index = 0
+                with self._lock:
+                    self.proxies = new_proxies
+                    self.proxy_rotation = deque(new_proxies)
             else:
                 logger.warning("No valid free proxies found")
                 
         except Exception as e:
             logger.error(f"Error refreshing free proxies: {e}")
     
-    @exponential_backoff(max_retries=2, initial_delay=1.0)
     def _validate_proxy(self, proxy_url: str) -> bool:
         """
-        Validate a proxy by testing a connection
+        Validate a proxy by testing a connection (a failing free proxy is dropped, not retried)
         """
         try:
             proxies = {
@@ -116,13 +134,12 @@ class ProxyManager:
         if not self.use_proxy:
             return {}
         
-        # Check if we need to refresh the proxy list (for free proxies)
-        if (self.proxy_type == "free" and 
-            (time.time() - self.last_refresh_time > self.refresh_interval or not self.proxy_list)):
-            self.refresh_proxies()
-        
         if self.proxy_type == "free":
-            return self._get_free_proxy()
+            with self._lock:
+                # Check if we need to refresh the proxy list (only one thread refreshes)
+                if time.monotonic() - self.last_refresh_time > self.refresh_interval or not self.proxies:
+                    self.refresh_proxies()
+                return self._get_free_proxy()
         elif self.proxy_type == "scraperapi":
             return self._get_scraperapi_proxy()
         elif self.proxy_type == "smartproxy":
@@ -136,18 +153,15 @@ class ProxyManager:
         """
         Get a free proxy from the list
         """
-        if not self.proxy_list:
+        if not self.proxy_rotation:
             return {}
         
-        # Get the next proxy
-        proxy_data = self.proxy_list[self.proxy_index]
-        proxy_url = proxy_data["url"]
-        
-        # Update the proxy index for next time
-        self.proxy_index = (self.proxy_index + 1) % len(self.proxy_list)
+        # Take the next proxy and move it to the back of the rotation
+        proxy_url = self.proxy_rotation[0]
+        self.proxy_rotation.rotate(-1)
         
         # Update last used time
-        proxy_data["last_used"] = time.time()
+        self.proxies[proxy_url].last_used = time.monotonic()
         
         return {
             "http": proxy_url,
@@ -188,11 +202,11 @@ class ProxyManager:
         if not self.use_proxy or self.proxy_type != "free" or not proxy_url:
             return
         
-        for proxy in self.proxy_list:
-            if proxy["url"] == proxy_url:
+        with self._lock:
+            proxy = self.proxies.get(proxy_url)
+            if proxy:
                 # Reset fail count on success
-                proxy["fail_count"] = 0
-                break
+                proxy.fail_count = 0
     
     def report_failure(self, proxy_url: Optional[str] = None) -> None:
         """
@@ -201,17 +215,17 @@ class ProxyManager:
         if not self.use_proxy or self.proxy_type != "free" or not proxy_url:
             return
         
-        for i, proxy in enumerate(self.proxy_list):
-            if proxy["url"] == proxy_url:
-                proxy["fail_count"] = proxy.get("fail_count", 0) + 1
-                
-                # Remove proxy if it fails too many times
-                if proxy["fail_count"] >= 3:
-                    del self.proxy_list[i]
-                    # Adjust proxy_index if necessary
-                    if i <= self.proxy_index and self.proxy_index > 0:
-                        self.proxy_index -= 1
-                break
+        with self._lock:
+            proxy = self.proxies.get(proxy_url)
+            if not proxy:
+                return
+            
+            proxy.fail_count += 1
+            
+            # Remove proxy if it fails too many times
+            if proxy.fail_count >= 3:
+                del self.proxies[proxy_url]
+                self.proxy_rotation.remove(proxy_url)
 
 # Create a singleton instance
 proxy_manager = ProxyManager()
@@ -4,14 +4,20 @@ sitemap_parser.py - Parses the PLUS sitemap to extract product URLs
 
 import os
 import time
-import requests
-import xml.etree.ElementTree as ET
+from io import BytesIO
+from lxml import etree
+from urllib3.util import make_headers
 from pathlib import Path
-from typing import List, Dict, Optional, Union, Any, Set
+from functools import lru_cache
+from itertools import chain
+from typing import List, Dict, Optional, Union, Any, Set, Iterator, Tuple
 from urllib.parse import urlparse
-from utils import logger, exponential_backoff, get_plus_headers, extract_sku_from_url, create_checkpoint, load_checkpoint
+from utils import logger, exponential_backoff, get_plus_headers, extract_sku_from_url, create_checkpoint, load_checkpoint, get_session
 from proxy_manager import proxy_manager
 
+# XML namespace of the sitemap protocol, in lxml's {uri}tag notation
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
 class SitemapParser:
     """
     Parse the PLUS sitemap to extract all product URLs
@@ -21,9 +27,12 @@ class SitemapParser:
         self.product_urls: List[Dict[str, str]] = []
         self.cache_file = Path("data/product_urls.txt")
         self.processed_skus: Set[str] = set()
+        # (mtime_ns, size) of the cache file product_urls was loaded from; the list is
+        # reused while the file is unchanged and released together with this parser
+        self._cache_signature: Optional[Tuple[int, int]] = None
     
     @exponential_backoff(max_retries=3)
-    def fetch_sitemap(self) -> str:
+    def fetch_sitemap(self) -> Union[str, bytes]:
         """
         Fetch the sitemap XML from PLUS
         """
@@ -35,6 +44,8 @@ class SitemapParser:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
             "Accept-Language": "nl-NL,nl;q=0.9,en-US;q=0.8,en;q=0.7",
+            # Gecomprimeerde XML; br/zstd alleen als de decoder daarvoor geïnstalleerd is
+            "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"],
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
             "Cache-Control": "max-age=0",
@@ -45,7 +56,7 @@ class SitemapParser:
         }
         
         logger.info(f"Fetching sitemap from {self.sitemap_url}")
-        response = requests.get(
+        response = get_session().get(
             self.sitemap_url,
             headers=headers,
             proxies=proxies,
@@ -61,32 +72,38 @@ class SitemapParser:
             return self._generate_fallback_sitemap()
             
         response.raise_for_status()
-        return response.text
+        logger.debug(f"Sitemap content-encoding: {response.headers.get('content-encoding', 'identity')}")
+        # Raw bytes: the XML parser decodes according to the document's own declaration
+        return response.content
     
-    def parse_sitemap(self, xml_content: Optional[str] = None) -> List[Dict[str, str]]:
+    def parse_sitemap(self, xml_content: Optional[Union[str, bytes]] = None) -> List[Dict[str, str]]:
         """
         Parse the sitemap XML to extract product URLs and their modification dates
         """
         if not xml_content:
             xml_content = self.fetch_sitemap()
         
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode("utf-8")
+        
         try:
-            root = ET.fromstring(xml_content)
-            namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
             urls = []
             
-            # Extract URLs from the sitemap
-            for url_elem in root.findall('.//ns:url', namespace):
-                loc_elem = url_elem.find('ns:loc', namespace)
-                lastmod_elem = url_elem.find('ns:lastmod', namespace)
+            # Stream the <url> elements and free each one once read, so the full tree is never built
+            for _, url_elem in etree.iterparse(BytesIO(xml_content), events=("end",), tag=f"{SITEMAP_NS}url"):
+                loc = url_elem.findtext(f"{SITEMAP_NS}loc")
                 
-                if loc_elem is not None and loc_elem.text:
+                if loc:
                     url_info = {
-                        "url": loc_elem.text,
-                        "lastmod": lastmod_elem.text if lastmod_elem is not None else "",
-                        "sku": extract_sku_from_url(loc_elem.text)
+                        "url": loc,
+                        "lastmod": url_elem.findtext(f"{SITEMAP_NS}lastmod", ""),
+                        "sku": extract_sku_from_url(loc)
                     }
                     urls.append(url_info)
+                
+                url_elem.clear()
+                while url_elem.getprevious() is not None:
+                    del url_elem.getparent()[0]
             
             self.product_urls = urls
             logger.info(f"Parsed sitemap: found {len(urls)} product URLs")
@@ -96,7 +113,7 @@ class SitemapParser:
             
             return urls
             
-        except ET.ParseError as e:
+        except etree.XMLSyntaxError as e:
             logger.error(f"Error parsing sitemap XML: {e}")
             return []
     
@@ -105,48 +122,77 @@ class SitemapParser:
         Cache the product URLs to a file
         """
         if not self.product_urls:
+            self._cache_signature = None
             return
         
         # Create directory if it doesn't exist
         self.cache_file.parent.mkdir(exist_ok=True)
         
-        # Write URLs to file, one per line
-        with open(self.cache_file, "w", encoding="utf-8") as f:
-            for url_info in self.product_urls:
-                # Write as "URL|SKU|LASTMOD" format
-                f.write(f"{url_info['url']}|{url_info.get('sku', '')}|{url_info.get('lastmod', '')}\n")
+        # Write URLs to file, one per line as "URL|SKU|LASTMOD", through a 1 MiB buffer
+        with open(self.cache_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.writelines(
+                f"{url_info['url']}|{url_info.get('sku', '')}|{url_info.get('lastmod', '')}\n"
+                for url_info in self.product_urls
+            )
         
+        # product_urls now matches the cache file, so later lookups on this parser can reuse it
+        st = self.cache_file.stat()
+        self._cache_signature = (st.st_mtime_ns, st.st_size)
         logger.debug(f"Cached {len(self.product_urls)} URLs to {self.cache_file}")
     
-    def load_cached_urls(self) -> List[Dict[str, str]]:
+    def iter_cached_urls(self) -> Iterator[Dict[str, str]]:
         """
-        Load product URLs from the cache file
+        Yield product URLs from the cache file one line at a time
         """
-        if not self.cache_file.exists():
-            logger.info("No cached URLs found")
-            return []
-        
-        urls = []
         with open(self.cache_file, "r", encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
                 if not line:
                     continue
                 
-                parts = line.split('|', 2)
-                url = parts[0]
+                # "URL|SKU|LASTMOD"; partition avoids a list allocation per line
+                url, sep, rest = line.partition('|')
+                if sep:
+                    sku, _, lastmod = rest.partition('|')
+                else:
+                    sku, lastmod = extract_sku_from_url(url), ""
                 
-                url_info = {
+                yield {
                     "url": url,
-                    "sku": parts[1] if len(parts) > 1 else extract_sku_from_url(url),
-                    "lastmod": parts[2] if len(parts) > 2 else ""
+                    "sku": sku,
+                    "lastmod": lastmod
                 }
-                urls.append(url_info)
+    
+    def load_cached_urls(self) -> List[Dict[str, str]]:
+        """
+        Load product URLs from the cache file
+        """
+        if not self.cache_file.exists():
+            logger.info("No cached URLs found")
+            return []
         
+        # Reuse the list this parser already loaded while the cache file is unchanged
+        urls = self._loaded_urls()
+        if urls is not None:
+            logger.info(f"Reusing {len(urls)} URLs already loaded from cache")
+            return urls
+        
+        st = self.cache_file.stat()
+        urls = list(self.iter_cached_urls())
         self.product_urls = urls
+        self._cache_signature = (st.st_mtime_ns, st.st_size)
         logger.info(f"Loaded {len(urls)} URLs from cache")
         return urls
     
+    def _loaded_urls(self) -> Optional[List[Dict[str, str]]]:
+        """
+        Return product_urls if it matches the cache file as it is now, else None
+        """
+        if self._cache_signature is None or not self.cache_file.exists():
+            return None
+        st = self.cache_file.stat()
+        return self.product_urls if (st.st_mtime_ns, st.st_size) == self._cache_signature else None
+    
     def get_urls(self, force_refresh: bool = False) -> List[Dict[str, str]]:
         """
         Get product URLs, either from cache or by fetching and parsing the sitemap
@@ -159,52 +205,68 @@ class SitemapParser:
     def get_unprocessed_urls(self, processed_skus: Optional[Set[str]] = None) -> List[Dict[str, str]]:
         """
         Get URLs that haven't been processed yet
+        The cache file is streamed through the filter unless this parser already holds its URLs,
+        so product_urls is only filled when the sitemap itself has to be parsed
         """
         if processed_skus is not None:
             self.processed_skus = processed_skus
-            
-        # Get all URLs
-        urls = self.get_urls()
         
-        # Filter out URLs for products that have already been processed
-        unprocessed = [url_info for url_info in urls 
-                      if url_info.get("sku") and url_info.get("sku") not in self.processed_skus]
+        # Get all URLs: the list already loaded, else streamed from the cache, else the sitemap
+        urls = self._loaded_urls()
+        if urls is None:
+            urls = self.iter_cached_urls() if self.cache_file.exists() else self.parse_sitemap()
         
-        logger.info(f"Found {len(unprocessed)} unprocessed URLs out of {len(urls)} total")
+        # Filter out URLs for products that have already been processed (one SKU lookup per URL)
+        processed = self.processed_skus
+        unprocessed = []
+        total = 0
+        for url_info in urls:
+            total += 1
+            sku = url_info.get("sku")
+            if sku and sku not in processed:
+                unprocessed.append(url_info)
+        
+        logger.info(f"Found {len(unprocessed)} unprocessed URLs out of {total} total")
         return unprocessed
     
-    def _generate_fallback_sitemap(self) -> str:
+    def _generate_fallback_sitemap(self) -> bytes:
         """
         Genereer een XML sitemap met een aantal bekende product-ID's als fallback
         wanneer de echte sitemap niet toegankelijk is.
         """
         logger.info("Generating fallback sitemap with known product patterns")
         
-        # Basis XML structuur
-        xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-        
-        # Enkele bekende product-ID's:
-        # - 553975: PLUS Boerentrots BBQ worst tuinkruiden
-        known_ids = [553975]
+        xml_content, url_count = _build_fallback_sitemap()
         
-        # Voeg wat systematische product-ID's toe (als patroon)
-        # PLUS heeft vaak opeenvolgende product-ID's
-        start_id = 100000
-        end_id = 600000
-        step = 10000  # Stap van 10000 om een redelijk aantal producten te hebben
-        
-        for product_id in range(start_id, end_id+1, step):
-            url = f"https://www.plus.nl/product/product-{product_id}"
-            lastmod = "2025-04-24T01:00:15+00:00"
-            xml_content += f'<url><loc>{url}</loc><lastmod>{lastmod}</lastmod></url>\n'
-            
-        # Voeg de bekende product-ID's toe
-        for product_id in known_ids:
-            url = f"https://www.plus.nl/product/product-{product_id}"
-            lastmod = "2025-04-24T01:00:15+00:00"
-            xml_content += f'<url><loc>{url}</loc><lastmod>{lastmod}</lastmod></url>\n'
-            
-        xml_content += '</urlset>'
-        
-        logger.info(f"Generated fallback sitemap with {len(range(start_id, end_id+1, step)) + len(known_ids)} product URLs")
+        logger.info(f"Generated fallback sitemap with {url_count} product URLs")
         return xml_content
+
+@lru_cache(maxsize=1)
+def _build_fallback_sitemap() -> Tuple[bytes, int]:
+    """
+    Bouw de fallback sitemap (de inhoud is constant, dus wordt maar één keer opgebouwd)
+    """
+    # Enkele bekende product-ID's:
+    # - 553975: PLUS Boerentrots BBQ worst tuinkruiden
+    known_ids = [553975]
+    
+    # Voeg wat systematische product-ID's toe (als patroon)
+    # PLUS heeft vaak opeenvolgende product-ID's
+    start_id = 100000
+    end_id = 600000
+    step = 10000  # Stap van 10000 om een redelijk aantal producten te hebben
+    
+    # Systematische ID's gevolgd door de bekende product-ID's
+    lastmod = "2025-04-24T01:00:15+00:00"
+    entries = [
+        f'<url><loc>https://www.plus.nl/product/product-{product_id}</loc><lastmod>{lastmod}</lastmod></url>\n'
+        for product_id in chain(range(start_id, end_id + 1, step), known_ids)
+    ]
+    
+    # Basis XML structuur
+    xml_content = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        + "".join(entries)
+        + '</urlset>'
+    )
+    return xml_content.encode("utf-8"), len(entries)
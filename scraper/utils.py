@@ -4,14 +4,21 @@ Contains header generation, logging setup, and retry mechanisms
 """
 
 import os
-import json
+import ujson
 import time
 import random
+import atexit
+import queue
 import logging
+import threading
 import colorlog
+import requests
+from requests.adapters import HTTPAdapter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
-from functools import wraps
+from typing import Dict, Any, List, Mapping, Optional, Union
+from functools import wraps, lru_cache
+from types import MappingProxyType
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -43,33 +50,55 @@ def setup_logger(name: str = "plus_scraper", log_file: bool = True) -> logging.L
     ))
     logger.addHandler(console_handler)
     
-    # Add file handler if requested
+    # Add file handler if requested; records are queued and written by one background thread
     if log_file:
+        logger.addHandler(QueueHandler(_get_log_queue()))
+    
+    return logger
+
+# Queue feeding the single shared log file writer, created on first use
+_log_queue = None
+
+def _get_log_queue() -> "queue.SimpleQueue":
+    """
+    Start the shared rotating log file listener once and return its queue
+    """
+    global _log_queue
+    if _log_queue is None:
         log_dir = Path("logs")
         log_dir.mkdir(exist_ok=True)
         
-        file_handler = logging.FileHandler(f"logs/plus_scraper_{time.strftime('%Y%m%d')}.log")
+        file_handler = RotatingFileHandler(
+            f"logs/plus_scraper_{time.strftime('%Y%m%d')}.log",
+            maxBytes=50_000_000, backupCount=5, encoding="utf-8"
+        )
         file_handler.setFormatter(logging.Formatter(
             '%(asctime)s [%(levelname)s] %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         ))
-        logger.addHandler(file_handler)
-    
-    return logger
+        
+        _log_queue = queue.SimpleQueue()
+        listener = QueueListener(_log_queue, file_handler)
+        listener.start()
+        # Flush queued records to disk when the process exits
+        atexit.register(listener.stop)
+    return _log_queue
 
 # Create the default logger
 logger = setup_logger()
 
-def get_plus_headers(referrer: str = "https://www.plus.nl") -> Dict[str, str]:
+@lru_cache(maxsize=8)
+def get_plus_headers(referrer: str = "https://www.plus.nl") -> Mapping[str, str]:
     """
     Generate headers for PLUS API requests
+    Built once per referrer and returned read-only, since the cached mapping is shared
     """
     csrf_token = os.getenv("PLUS_CSRF_TOKEN", "")
     
     if not csrf_token:
         raise ValueError("PLUS_CSRF_TOKEN environment variable is required")
     
-    return {
+    return MappingProxyType({
         "accept": "application/json",
         "accept-language": "nl-NL,nl;q=0.9,en-US;q=0.8,en;q=0.7",
         "content-type": "application/json; charset=UTF-8",
@@ -84,26 +113,52 @@ def get_plus_headers(referrer: str = "https://www.plus.nl") -> Dict[str, str]:
         "x-csrftoken": csrf_token,
         "Referer": referrer,
         "Referrer-Policy": "strict-origin-when-cross-origin"
-    }
+    })
 
-def save_to_retry(item: Dict[str, Any], reason: str = "unknown") -> None:
+# Shared HTTP session so repeated requests (and decorator retries) reuse pooled keep-alive connections
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, pool_block=False)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide requests session
+    """
+    return _session
+
+# Failed items are appended as one JSON object per line; retry.json is the legacy format
+RETRY_FILE = Path("data/retry.ndjson")
+LEGACY_RETRY_FILE = Path("data/retry.json")
+
+# Serializes retry file appends and the legacy migration when products are scraped concurrently
+_retry_lock = threading.Lock()
+
+def _migrate_legacy_retry() -> None:
     """
-    Save a failed item to retry.json for later processing
+    Move the items of a legacy retry.json into retry.ndjson (caller holds _retry_lock)
     """
-    retry_file = Path("data/retry.json")
-    retry_data = []
+    if not LEGACY_RETRY_FILE.exists():
+        return
     
-    # Create parent directory if it doesn't exist
-    retry_file.parent.mkdir(exist_ok=True)
+    try:
+        with open(LEGACY_RETRY_FILE, "r", encoding="utf-8") as f:
+            legacy_items = ujson.load(f)
+    except ValueError:
+        logger.warning("Legacy retry file was corrupted. Skipping its items.")
+        legacy_items = []
     
-    # Load existing retry data if available
-    if retry_file.exists():
-        try:
-            with open(retry_file, "r", encoding="utf-8") as f:
-                retry_data = json.load(f)
-        except json.JSONDecodeError:
-            logger.warning("Retry file was corrupted. Creating a new one.")
-            retry_data = []
+    with open(RETRY_FILE, "a", encoding="utf-8") as f:
+        f.writelines(ujson.dumps(item, ensure_ascii=False) + "\n" for item in legacy_items)
+    LEGACY_RETRY_FILE.unlink()
+    logger.info(f"Migrated {len(legacy_items)} items from {LEGACY_RETRY_FILE} to {RETRY_FILE}")
+
+def save_to_retry(item: Dict[str, Any], reason: str = "unknown") -> None:
+    """
+    Append a failed item to retry.ndjson for later processing
+    """
+    # Create parent directory if it doesn't exist
+    RETRY_FILE.parent.mkdir(exist_ok=True)
     
     # Add the current item with timestamp and reason
     retry_item = {
@@ -111,16 +166,36 @@ def save_to_retry(item: Dict[str, Any], reason: str = "unknown") -> None:
         "reason": reason,
         "data": item
     }
-    retry_data.append(retry_item)
     
-    # Write back to the file
-    with open(retry_file, "w", encoding="utf-8") as f:
-        json.dump(retry_data, f, indent=2, ensure_ascii=False)
+    with _retry_lock:
+        _migrate_legacy_retry()
+        with open(RETRY_FILE, "a", encoding="utf-8") as f:
+            f.write(ujson.dumps(retry_item, ensure_ascii=False) + "\n")
+
+def load_retry_items() -> List[Dict[str, Any]]:
+    """
+    Load all failed items saved for retry, including those of a legacy retry.json
+    """
+    with _retry_lock:
+        _migrate_legacy_retry()
+        if not RETRY_FILE.exists():
+            return []
+        
+        retry_items = []
+        with open(RETRY_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    retry_items.append(ujson.loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupted line in retry file")
+        return retry_items
 
 def exponential_backoff(max_retries: int = 3, initial_delay: float = 1.0,
-                       factor: float = 2.0, jitter: bool = True):
+                       factor: float = 2.0, jitter: bool = True, max_delay: float = 60.0):
     """
-    Decorator for exponential backoff with optional jitter
+    Decorator for exponential backoff with optional jitter, capped at max_delay seconds per wait
     """
     def decorator(func):
         @wraps(func)
@@ -140,7 +215,7 @@ def exponential_backoff(max_retries: int = 3, initial_delay: float = 1.0,
                     
                     # Calculate the next delay with optional jitter
                     if jitter:
-                        delay_with_jitter = delay * (0.8 + random.random() * 0.4)  # +/- 20%
+                        delay_with_jitter = min(delay * (0.8 + random.random() * 0.4), max_delay)  # +/- 20%
                     else:
                         delay_with_jitter = delay
                     
@@ -148,20 +223,52 @@ def exponential_backoff(max_retries: int = 3, initial_delay: float = 1.0,
                     
                     # Sleep and increase delay for next attempt
                     time.sleep(delay_with_jitter)
-                    delay *= factor
+                    delay = min(delay * factor, max_delay)
                     
         return wrapper
     return decorator
 
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter
+    Allows bursts of up to `burst` requests and refills at `rate` tokens per second
+    """
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """
+        Take one token, sleeping until it is available (rate <= 0 disables limiting)
+        """
+        if self.rate <= 0:
+            return
+        
+        with self._lock:
+            # Lazily refill for the time elapsed since the last call
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            
+            # Reserve a token; a negative balance is the queue of waiting callers
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        
+        if wait > 0:
+            time.sleep(wait)
+
 def extract_sku_from_url(url: str) -> Optional[str]:
     """
     Extract the SKU number from a PLUS product URL
     Example URL: https://www.plus.nl/product/plus-boerentrots-bbq-worst-tuinkruiden-krimp-280-g-553975
     """
     try:
-        # Split by hyphens and get the last component which should be the SKU
-        parts = url.strip('/').split('-')
-        return parts[-1]
+        # The SKU is everything after the last hyphen; rpartition avoids building a list of all parts
+        return url.rstrip('/').rpartition('-')[2]
     except Exception:
         return None
 
@@ -178,9 +285,10 @@ def format_filename(filename: str) -> str:
     return filename[:150]
 
 def create_checkpoint(current_position: Union[int, str], total: Optional[Union[int, str]] = None,
-                     checkpoint_type: str = "sitemap") -> None:
+                     checkpoint_type: str = "sitemap", extra: Optional[Dict[str, Any]] = None) -> None:
     """
     Save checkpoint information to a file
+    Written to a temporary file first and renamed, so a crash never leaves a partial checkpoint
     """
     checkpoint_file = Path(f"data/checkpoint_{checkpoint_type}.json")
     checkpoint_file.parent.mkdir(exist_ok=True)
@@ -194,11 +302,25 @@ def create_checkpoint(current_position: Union[int, str], total: Optional[Union[i
         checkpoint_data["total"] = total
         checkpoint_data["progress_pct"] = float(current_position) / float(total) * 100 if float(total) > 0 else 0
     
-    with open(checkpoint_file, "w", encoding="utf-8") as f:
-        json.dump(checkpoint_data, f, indent=2)
+    if extra:
+        checkpoint_data.update(extra)
+    
+    tmp_file = checkpoint_file.with_suffix(".json.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        ujson.dump(checkpoint_data, f, indent=2)
+    os.replace(tmp_file, checkpoint_file)
     
     logger.debug(f"Checkpoint saved: {current_position}")
 
+def clear_checkpoint(checkpoint_type: str = "sitemap") -> None:
+    """
+    Remove a checkpoint file once the work it tracks has finished
+    """
+    try:
+        Path(f"data/checkpoint_{checkpoint_type}.json").unlink()
+    except FileNotFoundError:
+        pass
+
 def load_checkpoint(checkpoint_type: str = "sitemap") -> Optional[Dict[str, Any]]:
     """
     Load checkpoint information from a file
@@ -210,7 +332,7 @@ def load_checkpoint(checkpoint_type: str = "sitemap") -> Optional[Dict[str, Any]
     
     try:
         with open(checkpoint_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+            return ujson.load(f)
+    except ValueError:
         logger.warning(f"Checkpoint file {checkpoint_file} is corrupted")
         return None
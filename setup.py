@@ -4,11 +4,44 @@ setup.py - Setup script for PLUS Product Scraper
 This script helps users configure the scraper for first-time use
 """
 
-import os
 import sys
-import subprocess
+
+# Abort on unsupported interpreters before importing anything else
+if sys.version_info < (3, 8):
+    sys.stderr.write(f"❌ Python 3.8 or higher is required (current: {sys.version.split()[0]})\n")
+    sys.exit(1)
+
+import os
+import hashlib
 from pathlib import Path
-import shutil
+
+ENV_PATH = Path("scraper/.env")
+ENV_EXAMPLE_PATH = Path("scraper/.env.example")
+
+NEXT_STEPS_MSG = """
+🎉 Setup completed successfully!
+
+📋 NEXT STEPS:
+1. 🔑 Configure your credentials:
+   - Edit scraper/.env file
+   - Add your CSRF token from PLUS.nl
+   - Set up cookies (see scraper/COOKIES.md)
+
+2. 🕷️  Run the scraper:
+   cd scraper
+   python main.py --all --limit 50
+
+3. 📊 Analyze the data:
+   python analyze_data.py
+
+4. 📚 Read the documentation:
+   - README.md - Main documentation
+   - SECURITY.md - Security and setup guide
+   - scraper/COOKIES.md - Cookie setup guide
+
+⚠️  REMEMBER: This tool is for educational purposes only.
+   Please respect PLUS.nl's terms of service!
+"""
 
 def print_header():
     print("\n" + "="*60)
@@ -17,71 +50,159 @@ def print_header():
     print("Welcome! This script will help you set up the PLUS Product Scraper.")
     print("Please follow the steps below to get started.\n")
 
-def check_python_version():
-    """Check if Python version is compatible"""
-    if sys.version_info < (3, 8):
-        print("❌ Python 3.8 or higher is required.")
-        print(f"   Current version: {sys.version}")
-        return False
+def print_python_version():
+    """Show the running Python version (unsupported versions are rejected at import)"""
     print(f"✅ Python version: {sys.version.split()[0]}")
-    return True
 
 def create_directories():
     """Create necessary directories"""
     print("\n📁 Creating directories...")
+    # Leaf directories only; makedirs creates scraper/data and data/analysis along the way
     directories = [
-        "scraper/data",
         "scraper/data/products",
         "scraper/data/analysis",
         "data/analysis/images"
     ]
     
     for directory in directories:
-        Path(directory).mkdir(parents=True, exist_ok=True)
-        print(f"   ✅ Created: {directory}")
+        os.makedirs(directory, exist_ok=True)
+    print("\n".join(f"   ✅ Created: {directory}" for directory in directories))
+
+REQUIREMENTS_FILES = ("scraper/requirements.txt", "requirements_analysis.txt")
+REQUIREMENTS_STAMP = Path("data/.requirements.sha256")
+# No self-update check (a PyPI round-trip), no prompts, and only warnings/errors on the console
+PIP_LOG = Path("data/pip.log")
+PIP_BASE = [sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--no-input", "--quiet"]
+
+def requirements_hash():
+    """Hash the requirements files together with the interpreter they are installed into"""
+    digest = hashlib.sha256(sys.executable.encode("utf-8"))
+    for requirements_file in REQUIREMENTS_FILES:
+        digest.update(Path(requirements_file).read_bytes())
+    return digest.hexdigest()
+
+def write_requirements_stamp(req_hash):
+    """Record that the current requirements are installed"""
+    REQUIREMENTS_STAMP.parent.mkdir(parents=True, exist_ok=True)
+    REQUIREMENTS_STAMP.write_text(req_hash)
+
+def missing_requirements():
+    """Return the requirement lines not satisfied by installed packages (None if it can't be checked)"""
+    from importlib import metadata
+    try:
+        from packaging.requirements import InvalidRequirement, Requirement
+    except ImportError:
+        return None
+    
+    missing = []
+    for requirements_file in REQUIREMENTS_FILES:
+        for line in Path(requirements_file).read_text(encoding="utf-8").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                # pip options such as -r, -e or --index-url; let pip handle the full files
+                return None
+            if requirement.marker and not requirement.marker.evaluate():
+                continue
+            try:
+                installed = metadata.version(requirement.name)
+            except metadata.PackageNotFoundError:
+                missing.append(line)
+                continue
+            if not requirement.specifier.contains(installed, prereleases=True):
+                missing.append(line)
+    return missing
+
+def print_log_tail(log, lines=50):
+    """Print the last lines of an installer log"""
+    from collections import deque
+    log.flush()
+    with open(log.name, "r", encoding="utf-8", errors="replace") as f:
+        tail = deque(f, lines)
+    print(f"   Last {len(tail)} lines of {log.name}:")
+    for line in tail:
+        print(f"      {line.rstrip()}")
 
 def install_dependencies():
     """Install required Python packages"""
     print("\n📦 Installing dependencies...")
     
-    # Install scraper dependencies
-    print("   Installing scraper requirements...")
-    try:
-        subprocess.run([sys.executable, "-m", "pip", "install", "-r", "scraper/requirements.txt"], 
-                      check=True, capture_output=True)
-        print("   ✅ Scraper dependencies installed")
-    except subprocess.CalledProcessError as e:
-        print(f"   ❌ Failed to install scraper dependencies: {e}")
-        return False
+    # Fail fast on a missing requirements file instead of waiting for pip to report it
+    for requirements_file in REQUIREMENTS_FILES:
+        if not Path(requirements_file).is_file():
+            print(f"   ❌ Requirements file not found: {requirements_file}")
+            return False
     
-    # Install analysis dependencies
-    print("   Installing analysis requirements...")
-    try:
-        subprocess.run([sys.executable, "-m", "pip", "install", "-r", "requirements_analysis.txt"], 
-                      check=True, capture_output=True)
-        print("   ✅ Analysis dependencies installed")
-    except subprocess.CalledProcessError as e:
-        print(f"   ❌ Failed to install analysis dependencies: {e}")
-        return False
+    # Skip pip entirely when these exact requirements were already installed successfully
+    req_hash = requirements_hash()
+    if REQUIREMENTS_STAMP.exists() and REQUIREMENTS_STAMP.read_text().strip() == req_hash:
+        print("   ✅ Dependencies already up to date")
+        return True
     
-    return True
+    # Skip the installer when every requirement is already satisfied
+    if missing_requirements() == []:
+        print("   ✅ All requirements already satisfied")
+        write_requirements_stamp(req_hash)
+        return True
+    
+    # Install scraper and analysis dependencies in one run so the resolver runs once and
+    # still sees the constraints of the requirements that are already satisfied
+    print("   Installing scraper and analysis requirements...")
+    targets = []
+    for requirements_file in REQUIREMENTS_FILES:
+        targets += ["-r", requirements_file]
+    
+    import shutil
+    import subprocess  # Only loaded when an installer actually has to run
+    
+    # Prefer wheels over source builds; PLUS_PIP_CACHE points pip at a custom (e.g. CI-persisted) cache
+    pip_command = PIP_BASE + ["--prefer-binary"]
+    cache_dir = os.environ.get("PLUS_PIP_CACHE")
+    if cache_dir:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        pip_command += ["--cache-dir", cache_dir]
+    
+    # uv resolves and downloads in parallel; try it first for this interpreter when it is on PATH
+    installers = [("pip", pip_command)]
+    uv = shutil.which("uv")
+    if uv:
+        installers.insert(0, ("uv", [uv, "pip", "install", "--python", sys.executable, "--quiet"]))
+    
+    # Installer output goes to a log file rather than a pipe; its tail is shown on failure
+    PIP_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(PIP_LOG, "wb") as log:
+        for name, command in installers:
+            try:
+                subprocess.run(command + targets, stdout=log, stderr=subprocess.STDOUT, check=True)
+            except subprocess.CalledProcessError as e:
+                print(f"   ⚠️  {name} failed (exit code {e.returncode})")
+                continue
+            print(f"   ✅ Dependencies installed ({name})")
+            write_requirements_stamp(req_hash)
+            return True
+        
+        print("   ❌ Failed to install dependencies")
+        print_log_tail(log)
+        return False
 
-def setup_environment():
+def setup_environment(force=False):
     """Set up environment configuration"""
     print("\n⚙️  Setting up environment...")
     
-    env_path = Path("scraper/.env")
-    env_example_path = Path("scraper/.env.example")
-    
-    if env_path.exists():
+    if ENV_PATH.exists() and not force:
         print("   ℹ️  .env file already exists")
-        response = input("   Do you want to overwrite it? (y/N): ").lower()
+        # Only prompt on a terminal; scripted runs keep the existing file instead of blocking on stdin
+        response = input("   Do you want to overwrite it? (y/N): ").lower() if sys.stdin.isatty() else "n"
         if response != 'y':
             print("   ⏭️  Skipping environment setup")
             return True
     
-    if env_example_path.exists():
-        shutil.copy(env_example_path, env_path)
+    if ENV_EXAMPLE_PATH.exists():
+        # Plain byte copy; the template's permission bits don't need to be carried over
+        ENV_PATH.write_bytes(ENV_EXAMPLE_PATH.read_bytes())
         print("   ✅ Created .env from template")
         print("   ⚠️  IMPORTANT: You must configure your .env file!")
         print("      See SECURITY.md and scraper/COOKIES.md for instructions")
@@ -93,42 +214,43 @@ def setup_environment():
 
 def show_next_steps():
     """Show next steps for the user"""
-    print("\n🎉 Setup completed successfully!")
-    print("\n📋 NEXT STEPS:")
-    print("1. 🔑 Configure your credentials:")
-    print("   - Edit scraper/.env file")
-    print("   - Add your CSRF token from PLUS.nl")
-    print("   - Set up cookies (see scraper/COOKIES.md)")
-    print("\n2. 🕷️  Run the scraper:")
-    print("   cd scraper")
-    print("   python main.py --all --limit 50")
-    print("\n3. 📊 Analyze the data:")
-    print("   python analyze_data.py")
-    print("\n4. 📚 Read the documentation:")
-    print("   - README.md - Main documentation")
-    print("   - SECURITY.md - Security and setup guide")
-    print("   - scraper/COOKIES.md - Cookie setup guide")
-    print("\n⚠️  REMEMBER: This tool is for educational purposes only.")
-    print("   Please respect PLUS.nl's terms of service!")
-
-def main():
+    sys.stdout.write(NEXT_STEPS_MSG)
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Set up the PLUS Product Scraper")
+    parser.add_argument("--force", action="store_true",
+                        help="Overwrite an existing scraper/.env without asking (or set PLUS_SETUP_FORCE=1)")
+    parser.add_argument("--skip-env", action="store_true", help="Leave scraper/.env untouched")
+    parser.add_argument("--no-install", action="store_true",
+                        help="Don't install dependencies (for environments managed elsewhere)")
+    args = parser.parse_args(argv)
+    args.force = args.force or os.environ.get("PLUS_SETUP_FORCE") == "1"
+    return args
+
+def main(argv=None):
     """Main setup function"""
+    args = parse_args(argv)
     print_header()
     
-    # Check Python version
-    if not check_python_version():
-        return 1
+    # Show Python version
+    print_python_version()
     
     # Create directories
     create_directories()
     
     # Install dependencies
-    if not install_dependencies():
+    if args.no_install:
+        print("\n⏭️  Skipping dependency installation (--no-install)")
+    elif not install_dependencies():
         print("\n❌ Setup failed during dependency installation")
         return 1
     
     # Setup environment
-    if not setup_environment():
+    if args.skip_env:
+        print("\n⏭️  Skipping environment setup (--skip-env)")
+    elif not setup_environment(force=args.force):
         print("\n❌ Setup failed during environment configuration")
         return 1
     